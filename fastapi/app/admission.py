@@ -0,0 +1,195 @@
+"""
+アドミッション制御モジュール
+
+リクエストを種類（クラス）ごとに同時実行数を制限し、溢れたリクエストを
+上限付きの待ち行列で待たせます。過負荷時は待ち続けずに 503 と Retry-After を返し、
+DBコネクションプールの枯渇によるタイムアウトや500エラーを防ぎます。
+
+全体の同時実行数は、コネクションプールの最大接続数 (pool_size + max_overflow) から
+アドミッション制御を通らないバックグラウンド処理（検索インデクサーなど）の分を
+差し引いた数を上限とし、空きができた際は優先度の高いクラス（読み取り）から順に実行を許可します。
+
+使い方:
+    @router.get("/...", dependencies=[Depends(admit("read"))])
+"""
+
+import asyncio
+from dataclasses import dataclass
+import itertools
+import logging
+import os
+from typing import Dict, Any, List
+
+from fastapi import HTTPException, status
+
+from .database import POOL_SIZE, MAX_OVERFLOW
+
+logger = logging.getLogger(__name__)
+
+# アドミッション制御を通らずに接続を使うバックグラウンド処理のために空けておく接続数
+# （検索インデクサーは取り込み中に最大2接続を使用）
+ADMISSION_RESERVED_CONNECTIONS = int(os.getenv("ADMISSION_RESERVED_CONNECTIONS", "3"))
+
+# 全体の同時実行数の上限（既定値はコネクションプールの最大接続数から予約分を除いた数）
+ADMISSION_CAPACITY = int(os.getenv(
+    "ADMISSION_CAPACITY",
+    str(max(POOL_SIZE + MAX_OVERFLOW - ADMISSION_RESERVED_CONNECTIONS, 1))
+))
+
+
+@dataclass
+class RequestClass:
+    """リクエストクラスごとの制限値"""
+    name: str
+    priority: int  # 値が小さいほど優先
+    max_concurrent: int  # 同時実行数の上限
+    max_queue: int  # 待ち行列の長さの上限
+    queue_timeout: float  # 待ち行列での最大待ち時間（秒）
+    retry_after: int  # 過負荷時に返す Retry-After（秒）
+
+
+# リクエストクラスの定義
+REQUEST_CLASSES: Dict[str, RequestClass] = {
+    "read": RequestClass("read", priority=0, max_concurrent=10, max_queue=50, queue_timeout=2.0, retry_after=1),
+    "analyze": RequestClass("analyze", priority=1, max_concurrent=8, max_queue=20, queue_timeout=5.0, retry_after=2),
+    "batch": RequestClass("batch", priority=2, max_concurrent=3, max_queue=5, queue_timeout=5.0, retry_after=5),
+}
+
+
+class Overloaded(Exception):
+    """過負荷のためリクエストを受け付けられない場合の例外"""
+
+
+class AdmissionController:
+    """
+    優先度付きの同時実行数制御
+
+    待ち行列は長さに上限があるため、空きができた際の走査は線形で十分です。
+    """
+
+    def __init__(self, capacity: int, classes: Dict[str, RequestClass]):
+        self.capacity = capacity
+        self.classes = classes
+        self.active_total = 0
+        self.active = {name: 0 for name in classes}
+        self.admitted = {name: 0 for name in classes}
+        self.shed = {name: 0 for name in classes}
+        self.waiters: List[Any] = []  # (priority, seq, class_name, future)
+        self._seq = itertools.count()
+
+    def queued(self, name: str) -> int:
+        return sum(1 for waiter in self.waiters if waiter[2] == name)
+
+    def _can_run(self, request_class: RequestClass) -> bool:
+        return (
+            self.active_total < self.capacity
+            and self.active[request_class.name] < request_class.max_concurrent
+        )
+
+    def _start(self, name: str):
+        self.active_total += 1
+        self.active[name] += 1
+        self.admitted[name] += 1
+
+    def _reject(self, name: str):
+        self.shed[name] += 1
+        raise Overloaded(name)
+
+    async def acquire(self, name: str):
+        """
+        実行枠を確保します。確保できない場合は Overloaded を送出します。
+        """
+        request_class = self.classes[name]
+
+        # 実行可能な同等以上の優先度の待ちがなければすぐに実行
+        ahead = any(
+            waiter[0] <= request_class.priority and self._can_run(self.classes[waiter[2]])
+            for waiter in self.waiters
+        )
+        if not ahead and self._can_run(request_class):
+            self._start(name)
+            return
+
+        if self.queued(name) >= request_class.max_queue:
+            self._reject(name)
+
+        future = asyncio.get_running_loop().create_future()
+        waiter = (request_class.priority, next(self._seq), name, future)
+        self.waiters.append(waiter)
+        try:
+            await asyncio.wait_for(future, request_class.queue_timeout)
+        except asyncio.TimeoutError:
+            if waiter in self.waiters:
+                self.waiters.remove(waiter)
+            self._reject(name)
+        except asyncio.CancelledError:
+            # クライアント切断などで待ちが取り消された場合
+            if waiter in self.waiters:
+                self.waiters.remove(waiter)
+            elif future.done() and not future.cancelled():
+                self.release(name)
+            raise
+
+    def release(self, name: str):
+        """実行枠を解放し、待っているリクエストに優先度順で枠を割り当てます"""
+        self.active_total -= 1
+        self.active[name] -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        for waiter in sorted(self.waiters):
+            if self.active_total >= self.capacity:
+                break
+            _, _, name, future = waiter
+            if future.done() or not self._can_run(self.classes[name]):
+                continue
+            self.waiters.remove(waiter)
+            self._start(name)
+            future.set_result(None)
+
+    def metrics(self) -> Dict[str, Any]:
+        """クラスごとの実行数・待ち行列の長さ・受付数・棄却数を返します"""
+        return {
+            "capacity": self.capacity,
+            "active": self.active_total,
+            "classes": {
+                name: {
+                    "active": self.active[name],
+                    "queued": self.queued(name),
+                    "admitted": self.admitted[name],
+                    "shed": self.shed[name],
+                    "max_concurrent": request_class.max_concurrent,
+                    "max_queue": request_class.max_queue
+                }
+                for name, request_class in self.classes.items()
+            }
+        }
+
+
+controller = AdmissionController(ADMISSION_CAPACITY, REQUEST_CLASSES)
+
+
+def admit(name: str):
+    """
+    指定したクラスの実行枠を確保する依存関係を返します。
+
+    過負荷時は 503 Service Unavailable と Retry-After ヘッダーを返します。
+    """
+    request_class = REQUEST_CLASSES[name]
+
+    async def dependency():
+        try:
+            await controller.acquire(name)
+        except Overloaded:
+            logger.warning("過負荷のため %s リクエストを棄却しました", name)
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="サーバーが混雑しています。しばらくしてから再試行してください",
+                headers={"Retry-After": str(request_class.retry_after)}
+            )
+        try:
+            yield
+        finally:
+            controller.release(name)
+
+    return dependency
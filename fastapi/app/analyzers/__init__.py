@@ -16,6 +16,8 @@
 from importlib import import_module
 import logging
 
+from ..lookup import with_lookup
+
 logger = logging.getLogger(__name__)
 
 def get_analyzer(exam_type: str):
@@ -37,9 +39,10 @@ def get_analyzer(exam_type: str):
         
         # モジュールから同名の関数を取得
         analyzer_func = getattr(module, module_name)
-        logger.info(f"解析モジュール {module_name} を正常に読み込みました")
+        logger.debug("解析モジュール %s を正常に読み込みました", module_name)
         
-        return analyzer_func
+        # 事前計算ルックアップテーブルがあれば表引きに置き換える
+        return with_lookup(module_name, analyzer_func)
     except (ImportError, AttributeError) as e:
-        logger.error(f"解析モジュール {module_name} の読み込みに失敗しました: {str(e)}")
+        logger.error("解析モジュール %s の読み込みに失敗しました: %s", module_name, e)
         return None
\ No newline at end of file
@@ -17,6 +17,12 @@ from typing import Dict, Any, List, Optional
 
 logger = logging.getLogger(__name__)
 
+# 事前計算ルックアップテーブル用の回答の定義域 (app.lookup を参照)
+LOOKUP_DOMAIN = {
+    "items": [f"item{i}" for i in range(9)],
+    "values": [0, 1, 2, 3]
+}
+
 def phq_9(result_data: Dict[str, Any]) -> Dict[str, Any]:
     """
     PHQ-9検査結果の解析を行います。
@@ -31,7 +37,7 @@ def phq_9(result_data: Dict[str, Any]) -> Dict[str, Any]:
             - interpretation: 解析の解釈
             - details: 詳細な分析結果
     """
-    logger.info("PHQ-9の解析を開始します")
+    logger.debug("PHQ-9の解析を開始します")
     
     # 有効なアイテム番号
     valid_items = [f"item{i}" for i in range(9)]  # item0からitem8までが有効
@@ -39,6 +45,7 @@ def phq_9(result_data: Dict[str, Any]) -> Dict[str, Any]:
     # スコアの抽出と合計計算
     item_scores = {}
     total_score = 0
+    missing_items = []
     
     for item_key in valid_items:
         if item_key in result_data and result_data[item_key] is not None:
@@ -46,9 +53,12 @@ def phq_9(result_data: Dict[str, Any]) -> Dict[str, Any]:
             item_scores[item_key] = score
             total_score += score
         else:
-            logger.warning(f"{item_key}のスコアがありません。0として扱います。")
+            missing_items.append(item_key)
             item_scores[item_key] = 0
     
+    if missing_items:
+        logger.warning("%sのスコアがありません。0として扱います。", "、".join(missing_items))
+    
     # 重症度の評価
     severity = get_severity(total_score)
     
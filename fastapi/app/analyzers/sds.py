@@ -32,7 +32,7 @@ def sds(result_data: Dict[str, Any]) -> Dict[str, Any]:
             - interpretation: 解析の解釈
             - details: 詳細な分析結果
     """
-    logger.info("SDSの解析を開始します")
+    logger.debug("SDSの解析を開始します")
     
     # 有効なアイテム番号
     valid_items = [f"item{i}" for i in range(20)]  # item0からitem19までが有効
@@ -40,6 +40,7 @@ def sds(result_data: Dict[str, Any]) -> Dict[str, Any]:
     # スコアの抽出と合計計算
     item_scores = {}
     total_score = 0
+    missing_items = []
     
     # SDSでは、一部の項目のスコアが逆転項目になっています
     # 通常項目: item0, item1, item3, item4, item5, item7, item8, item9, item10, item13, item15, item19
@@ -60,10 +61,13 @@ def sds(result_data: Dict[str, Any]) -> Dict[str, Any]:
             item_scores[item_key] = score
             total_score += score
         else:
-            logger.warning(f"{item_key}のスコアがありません。最小値(1)として扱います。")
+            missing_items.append(item_key)
             item_scores[item_key] = 1
             total_score += 1
     
+    if missing_items:
+        logger.warning("%sのスコアがありません。最小値(1)として扱います。", "、".join(missing_items))
+    
     # SDS指標の計算 (合計点 ÷ 80 × 100)
     sds_index = (total_score / 80) * 100
     
@@ -0,0 +1,165 @@
+"""
+解析結果のアーカイブパッケージ
+
+一定期間より古い解析結果を analysis_results テーブルから移動し、
+月・検査ごとの列指向セグメントファイル (segment モジュール) に圧縮して保存します。
+確認済みのトリアージフラグも、確認の記録 (確認日時・確認者) を残すため同じ単位で保存します。
+セグメントは追記専用で、アーカイブを実行するたびに新しいファイルが追加され、
+マニフェスト (manifest.json) に登録されます。
+
+読み取り側はマニフェストの範囲情報とキャッシュしたセグメントのヘッダーで
+対象のセグメントを絞り込み、ホットテーブルの結果と合わせて返します。
+アーカイブ処理が途中で中断して同じ行が複数のセグメントに書き出された場合も、
+読み取り時にIDで重複を除きます。
+
+保存先 (ARCHIVE_DIR) は既定で fastapi/archive（コンテナ内では /app/archive）で、
+docker-compose.yml でホストのディレクトリをマウントしています。
+
+アーカイブの実行:
+    python -m app.archive.job [--older-than-days N]
+"""
+
+import json
+import logging
+import os
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple
+
+from .segment import SegmentReader, fsync_directory, read_header
+
+logger = logging.getLogger(__name__)
+
+# アーカイブの保存先ディレクトリ
+ARCHIVE_DIR = os.getenv(
+    "ARCHIVE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "archive")
+)
+
+MANIFEST_NAME = "manifest.json"
+
+# セグメントの種類
+ANALYSIS_RESULTS = "analysis_results"
+TRIAGE_FLAGS = "triage_flags"
+
+# マニフェストのキャッシュ (更新時刻, 内容)
+_manifest_cache: Dict[str, Any] = {"mtime": None, "segments": []}
+
+
+def manifest_path() -> str:
+    return os.path.join(ARCHIVE_DIR, MANIFEST_NAME)
+
+
+def load_segments() -> List[Dict[str, Any]]:
+    """マニフェストに登録されたセグメントの一覧を返します（変更がなければキャッシュを使用）"""
+    path = manifest_path()
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return []
+
+    if _manifest_cache["mtime"] != mtime:
+        with open(path, encoding="utf-8") as f:
+            _manifest_cache["segments"] = json.load(f)["segments"]
+        _manifest_cache["mtime"] = mtime
+    return _manifest_cache["segments"]
+
+
+def append_segments(entries: List[Dict[str, Any]]):
+    """
+    マニフェストにセグメントを追加します。
+
+    一時ファイルを fsync してから置き換え、ディレクトリも fsync するため、
+    戻った時点でマニフェストの更新はディスクに書き込まれています。
+    """
+    segments = list(load_segments()) + entries
+    path = manifest_path()
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"segments": segments}, f, ensure_ascii=False, indent=1)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    fsync_directory(ARCHIVE_DIR)
+
+
+def _segments_of(kind: str) -> Iterable[Dict[str, Any]]:
+    # 種類のないエントリは解析結果のセグメント
+    return (entry for entry in load_segments() if entry.get("kind", ANALYSIS_RESULTS) == kind)
+
+
+def _select(
+    segments: Iterable[Dict[str, Any]],
+    column: str,
+    values: Iterable[int],
+    patient_id: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    values = set(values)
+    rows: Dict[int, Dict[str, Any]] = {}
+    for entry in segments:
+        path = os.path.join(ARCHIVE_DIR, entry["path"])
+        header = read_header(path)
+        if patient_id is not None and not header.has_patient(patient_id):
+            continue
+        reader = SegmentReader(path, header)
+        try:
+            for row in reader.select(column, values):
+                rows.setdefault(row["id"], row)
+        finally:
+            reader.close()
+    return sorted(rows.values(), key=lambda row: row["id"])
+
+
+def scan_analyses(columns: List[str]) -> Iterator[Tuple[Any, ...]]:
+    """
+    アーカイブの全ての解析結果を、指定した列の値のタプルとして順に返します。
+
+    セグメントごとに必要な列だけを展開します。アーカイブ処理の中断で同じ行が
+    複数のセグメントにある場合は重複して返すため、呼び出し側でIDを見て扱ってください。
+    """
+    for entry in _segments_of(ANALYSIS_RESULTS):
+        path = os.path.join(ARCHIVE_DIR, entry["path"])
+        reader = SegmentReader(path, read_header(path))
+        try:
+            values = [reader.column(column) for column in columns]
+        finally:
+            reader.close()
+        yield from zip(*values)
+
+
+def find_patient_analyses(patient_id: int) -> List[Dict[str, Any]]:
+    """アーカイブから患者の解析結果を取得します"""
+    segments = [
+        entry for entry in _segments_of(ANALYSIS_RESULTS)
+        if entry["min_patient_id"] <= patient_id <= entry["max_patient_id"]
+    ]
+    return _select(segments, "patient_id", [patient_id], patient_id=patient_id)
+
+
+def find_by_result_ids(result_ids: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+    """
+    アーカイブから検査結果IDに対応する解析結果をまとめて取得します。
+
+    Returns:
+        検査結果IDをキー、解析結果の行を値とする辞書
+    """
+    result_ids = set(result_ids)
+    if not result_ids:
+        return {}
+    segments = [
+        entry for entry in _segments_of(ANALYSIS_RESULTS)
+        if any(entry["min_result_id"] <= result_id <= entry["max_result_id"] for result_id in result_ids)
+    ]
+    return {row["result_id"]: row for row in _select(segments, "result_id", result_ids)}
+
+
+def find_by_result_id(result_id: int) -> Optional[Dict[str, Any]]:
+    """アーカイブから検査結果IDに対応する解析結果を取得します"""
+    return find_by_result_ids([result_id]).get(result_id)
+
+
+def find_patient_triage_flags(patient_id: int) -> List[Dict[str, Any]]:
+    """アーカイブから患者の確認済みトリアージフラグを取得します"""
+    segments = [
+        entry for entry in _segments_of(TRIAGE_FLAGS)
+        if entry["min_patient_id"] <= patient_id <= entry["max_patient_id"]
+    ]
+    return _select(segments, "patient_id", [patient_id], patient_id=patient_id)
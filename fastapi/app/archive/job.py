@@ -0,0 +1,191 @@
+"""
+解析結果のアーカイブジョブ
+
+作成から一定期間が経過した解析結果を、月・検査ごとのセグメントファイルに書き出し、
+マニフェストに登録してから analysis_results テーブルから削除します。
+未確認のトリアージフラグが付いた解析結果は対象外で、確認済みのフラグは
+triage ディレクトリのセグメントに書き出してから削除します。
+
+セグメントとマニフェストを fsync でディスクに書き込んでから削除をコミットするため、
+途中で中断しても解析結果は失われません（ホットテーブルとアーカイブの両方にある行は
+読み取り時にホット側が優先され、再実行で重複して書き出された行はIDで除かれます）。
+
+使い方:
+    python -m app.archive.job [--older-than-days N]
+"""
+
+import argparse
+from collections import defaultdict
+from datetime import datetime, timedelta
+import logging
+import os
+from typing import Dict, Any, List, Tuple
+
+from .. import models
+from ..database import SessionLocal
+from . import ARCHIVE_DIR, TRIAGE_FLAGS, append_segments
+from .segment import COLUMNS, TRIAGE_FLAG_COLUMNS, fsync_directory, write_segment
+
+logger = logging.getLogger(__name__)
+
+# 1回に移動する解析結果の件数
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "10000"))
+
+# アーカイブ対象とする経過日数の既定値
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "365"))
+
+
+def _next_segment_path(directory: str) -> str:
+    """ディレクトリに追加する新しいセグメントの相対パスを返します"""
+    os.makedirs(os.path.join(ARCHIVE_DIR, directory), exist_ok=True)
+    existing = [
+        name for name in os.listdir(os.path.join(ARCHIVE_DIR, directory))
+        if name.endswith(".seg")
+    ]
+    return os.path.join(directory, f"part-{len(existing) + 1:06d}.seg")
+
+
+def _sync_directories(paths: List[str]):
+    """書き出したセグメントのディレクトリと、その親ディレクトリのエントリを fsync します"""
+    directories = set()
+    for path in paths:
+        directory = os.path.dirname(path)
+        while directory:
+            directories.add(directory)
+            directory = os.path.dirname(directory)
+    for directory in sorted(directories, key=len, reverse=True):
+        fsync_directory(os.path.join(ARCHIVE_DIR, directory))
+    fsync_directory(ARCHIVE_DIR)
+
+
+def write_batch(analyses: List[models.AnalysisResult]) -> List[Dict[str, Any]]:
+    """
+    解析結果を月・検査ごとにセグメントファイルへ書き出します。
+
+    Returns:
+        マニフェストに追加するエントリのリスト
+    """
+    groups: Dict[Tuple[str, int], List[Dict[str, Any]]] = defaultdict(list)
+    for analysis in analyses:
+        row = {name: getattr(analysis, name) for name, _ in COLUMNS}
+        groups[(analysis.created_at.strftime("%Y-%m"), analysis.exam_id)].append(row)
+
+    entries = []
+    for (month, exam_id), rows in sorted(groups.items()):
+        path = _next_segment_path(os.path.join(month, f"exam-{exam_id}"))
+        write_segment(os.path.join(ARCHIVE_DIR, path), rows)
+        entries.append({
+            "path": path,
+            "month": month,
+            "exam_id": exam_id,
+            "rows": len(rows),
+            "min_id": min(row["id"] for row in rows),
+            "max_id": max(row["id"] for row in rows),
+            "min_result_id": min(row["result_id"] for row in rows),
+            "max_result_id": max(row["result_id"] for row in rows),
+            "min_patient_id": min(row["patient_id"] for row in rows),
+            "max_patient_id": max(row["patient_id"] for row in rows),
+            "archived_at": datetime.now().isoformat(timespec="seconds"),
+        })
+    return entries
+
+
+def write_triage_flags(flags: List[models.TriageFlag]) -> List[Dict[str, Any]]:
+    """
+    確認済みのトリアージフラグをセグメントファイルへ書き出します。
+
+    Returns:
+        マニフェストに追加するエントリのリスト（フラグがなければ空）
+    """
+    if not flags:
+        return []
+    rows = [{name: getattr(flag, name) for name, _ in TRIAGE_FLAG_COLUMNS} for flag in flags]
+    path = _next_segment_path("triage")
+    write_segment(os.path.join(ARCHIVE_DIR, path), rows, TRIAGE_FLAG_COLUMNS)
+    return [{
+        "kind": TRIAGE_FLAGS,
+        "path": path,
+        "rows": len(rows),
+        "min_id": min(row["id"] for row in rows),
+        "max_id": max(row["id"] for row in rows),
+        "min_patient_id": min(row["patient_id"] for row in rows),
+        "max_patient_id": max(row["patient_id"] for row in rows),
+        "archived_at": datetime.now().isoformat(timespec="seconds"),
+    }]
+
+
+def archive(older_than_days: int = ARCHIVE_AFTER_DAYS) -> int:
+    """
+    古い解析結果をアーカイブに移動します。
+
+    Returns:
+        移動した解析結果の数
+    """
+    cutoff = datetime.now() - timedelta(days=older_than_days)
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+
+    db = SessionLocal()
+    archived = 0
+    try:
+        unacknowledged = db.query(models.TriageFlag.analysis_id).filter(
+            models.TriageFlag.acknowledged == False  # noqa: E712
+        )
+        while True:
+            analyses = (
+                db.query(models.AnalysisResult)
+                .filter(
+                    models.AnalysisResult.created_at < cutoff,
+                    ~models.AnalysisResult.id.in_(unacknowledged)
+                )
+                .order_by(models.AnalysisResult.id)
+                .limit(ARCHIVE_BATCH_SIZE)
+                .all()
+            )
+            if not analyses:
+                break
+
+            ids = [analysis.id for analysis in analyses]
+            flags = db.query(models.TriageFlag).filter(
+                models.TriageFlag.analysis_id.in_(ids)
+            ).order_by(models.TriageFlag.id).all()
+
+            # セグメントとマニフェストをディスクに書き込んでから削除する
+            entries = write_batch(analyses) + write_triage_flags(flags)
+            _sync_directories([entry["path"] for entry in entries])
+            append_segments(entries)
+
+            db.query(models.TriageFlag).filter(
+                models.TriageFlag.analysis_id.in_(ids)
+            ).delete(synchronize_session=False)
+            db.query(models.AnalysisResult).filter(
+                models.AnalysisResult.id.in_(ids)
+            ).delete(synchronize_session=False)
+            db.commit()
+            db.expunge_all()
+
+            archived += len(ids)
+            logger.info("解析結果を %d 件アーカイブしました (累計 %d 件)", len(ids), archived)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+    return archived
+
+
+def main():
+    parser = argparse.ArgumentParser(description="古い解析結果をアーカイブに移動します")
+    parser.add_argument(
+        "--older-than-days", type=int, default=ARCHIVE_AFTER_DAYS,
+        help="作成からこの日数が経過した解析結果を移動する"
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    archived = archive(args.older_than_days)
+    logger.info("アーカイブが完了しました: %d 件", archived)
+
+
+if __name__ == "__main__":
+    main()
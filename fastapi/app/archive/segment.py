@@ -0,0 +1,263 @@
+"""
+列指向セグメントファイルの読み書き
+
+1つのセグメントファイルには、同じ月・同じ検査の解析結果を列ごとに圧縮して格納します。
+
+ファイルの構成:
+- マジック (8バイト) とヘッダー長 (4バイト、リトルエンディアン)
+- ヘッダー (JSON): 行数、含まれる患者IDの一覧 (昇順)、列ごとの型・位置・長さ
+- 列データ: 列ごとに zlib で圧縮したバイト列
+
+セグメントは書き出した後に変更されないため、ヘッダーはパスごとにキャッシュします。
+読み込み時はキャッシュしたヘッダーの患者ID一覧で対象外のセグメントを読み飛ばし、
+対象のセグメントだけをメモリマップして必要な列を展開します。
+"""
+
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timedelta
+import json
+import math
+import mmap
+import os
+import struct
+import sys
+import zlib
+from typing import Dict, Any, Collection, List, Optional, Tuple
+
+MAGIC = b"PSYSEG\x00\x01"
+HEADER_LENGTH = struct.Struct("<I")
+
+# 日時は基準時刻からのマイクロ秒で格納する
+EPOCH = datetime(1970, 1, 1)
+NULL_INT = -2 ** 63
+NULL_LENGTH = 0xFFFFFFFF
+
+# 解析結果の列と型
+#   int: 64ビット整数, bool: 0/1 の整数, float: 倍精度浮動小数点, datetime: マイクロ秒
+#   category: 辞書符号化した文字列 (重症度や解釈文など繰り返しの多い値)
+#   text: 長さ付きの文字列 (details のJSONなど)
+COLUMNS = [
+    ("id", "int"),
+    ("result_id", "int"),
+    ("patient_id", "int"),
+    ("exam_id", "int"),
+    ("total_score", "float"),
+    ("severity", "category"),
+    ("interpretation", "category"),
+    ("details", "text"),
+    ("created_at", "datetime"),
+    ("updated_at", "datetime"),
+]
+
+# トリアージフラグの列と型（確認済みのフラグを解析結果と一緒にアーカイブする）
+TRIAGE_FLAG_COLUMNS = [
+    ("id", "int"),
+    ("analysis_id", "int"),
+    ("result_id", "int"),
+    ("patient_id", "int"),
+    ("exam_id", "int"),
+    ("reason", "category"),
+    ("total_score", "float"),
+    ("severity", "category"),
+    ("acknowledged", "bool"),
+    ("acknowledged_at", "datetime"),
+    ("acknowledged_by", "category"),
+    ("created_at", "datetime"),
+]
+
+COMPRESSION_LEVEL = 6
+
+
+def _to_bytes(values: array) -> bytes:
+    if sys.byteorder != "little":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _from_bytes(typecode: str, data: bytes) -> array:
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values
+
+
+def _encode_column(kind: str, values: List[Any]):
+    """列の値をバイト列に変換します。辞書符号化の場合は辞書も返します"""
+    if kind == "int":
+        return _to_bytes(array("q", (NULL_INT if v is None else v for v in values))), None
+    if kind == "bool":
+        return _to_bytes(array("q", (NULL_INT if v is None else int(v) for v in values))), None
+    if kind == "float":
+        return _to_bytes(array("d", (math.nan if v is None else v for v in values))), None
+    if kind == "datetime":
+        return _to_bytes(array("q", (
+            NULL_INT if v is None else (v - EPOCH) // timedelta(microseconds=1)
+            for v in values
+        ))), None
+    if kind == "category":
+        dictionary: Dict[Any, int] = {}
+        codes = array("I", (dictionary.setdefault(v, len(dictionary)) for v in values))
+        return _to_bytes(codes), list(dictionary)
+    if kind == "text":
+        encoded = [None if v is None else v.encode("utf-8") for v in values]
+        lengths = array("I", (NULL_LENGTH if v is None else len(v) for v in encoded))
+        return _to_bytes(lengths) + b"".join(v for v in encoded if v), None
+    raise ValueError(f"不明な列の型です: {kind}")
+
+
+def _decode_column(kind: str, data: bytes, rows: int, dictionary: Optional[List[Any]]) -> List[Any]:
+    """バイト列を列の値に戻します"""
+    if kind == "int":
+        return [None if v == NULL_INT else v for v in _from_bytes("q", data)]
+    if kind == "bool":
+        return [None if v == NULL_INT else bool(v) for v in _from_bytes("q", data)]
+    if kind == "float":
+        return [None if math.isnan(v) else v for v in _from_bytes("d", data)]
+    if kind == "datetime":
+        return [
+            None if v == NULL_INT else EPOCH + timedelta(microseconds=v)
+            for v in _from_bytes("q", data)
+        ]
+    if kind == "category":
+        return [dictionary[code] for code in _from_bytes("I", data)]
+    if kind == "text":
+        lengths = _from_bytes("I", data[:4 * rows])
+        values = []
+        offset = 4 * rows
+        for length in lengths:
+            if length == NULL_LENGTH:
+                values.append(None)
+                continue
+            values.append(data[offset:offset + length].decode("utf-8"))
+            offset += length
+        return values
+    raise ValueError(f"不明な列の型です: {kind}")
+
+
+def fsync_directory(path: str):
+    """ディレクトリのエントリ（新しいファイル名）をディスクに書き込みます"""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def write_segment(path: str, rows: List[Dict[str, Any]], columns_spec: List[Tuple[str, str]] = COLUMNS):
+    """
+    行をセグメントファイルに書き出します。
+
+    書き出した内容は fsync でディスクに書き込んでから戻ります
+    （ディレクトリのエントリは呼び出し元で fsync_directory を呼んでください）。
+    """
+    columns = []
+    blobs = []
+    offset = 0
+    for name, kind in columns_spec:
+        data, dictionary = _encode_column(kind, [row[name] for row in rows])
+        blob = zlib.compress(data, COMPRESSION_LEVEL)
+        column = {"name": name, "type": kind, "offset": offset, "length": len(blob)}
+        if dictionary is not None:
+            column["dictionary"] = dictionary
+        columns.append(column)
+        blobs.append(blob)
+        offset += len(blob)
+
+    header = json.dumps({
+        "rows": len(rows),
+        "patient_ids": sorted({row["patient_id"] for row in rows}),
+        "columns": columns,
+    }, ensure_ascii=False).encode("utf-8")
+
+    with open(path, "wb") as f:
+        f.write(MAGIC)
+        f.write(HEADER_LENGTH.pack(len(header)))
+        f.write(header)
+        for blob in blobs:
+            f.write(blob)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+class SegmentHeader:
+    """セグメントファイルのヘッダー"""
+
+    __slots__ = ("rows", "patient_ids", "columns", "data_start")
+
+    def __init__(self, header: Dict[str, Any], data_start: int):
+        self.rows: int = header["rows"]
+        self.patient_ids: List[int] = header["patient_ids"]
+        self.columns = {column["name"]: column for column in header["columns"]}
+        self.data_start = data_start
+
+    def has_patient(self, patient_id: int) -> bool:
+        """セグメントに患者の行が含まれるかを返します（ファイルを開かずに判定）"""
+        index = bisect_left(self.patient_ids, patient_id)
+        return index < len(self.patient_ids) and self.patient_ids[index] == patient_id
+
+
+def _parse_header(path: str, data) -> SegmentHeader:
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path} はセグメントファイルではありません")
+    (header_length,) = HEADER_LENGTH.unpack_from(data, len(MAGIC))
+    header_start = len(MAGIC) + HEADER_LENGTH.size
+    return SegmentHeader(
+        json.loads(data[header_start:header_start + header_length]),
+        header_start + header_length
+    )
+
+
+# 読み込み済みのヘッダー (パス → SegmentHeader)
+_header_cache: Dict[str, SegmentHeader] = {}
+
+
+def read_header(path: str) -> SegmentHeader:
+    """セグメントのヘッダーを返します（セグメントは変更されないためパスごとにキャッシュ）"""
+    header = _header_cache.get(path)
+    if header is None:
+        with open(path, "rb") as f:
+            data = f.read(len(MAGIC) + HEADER_LENGTH.size)
+            if data[:len(MAGIC)] != MAGIC or len(data) < len(MAGIC) + HEADER_LENGTH.size:
+                raise ValueError(f"{path} はセグメントファイルではありません")
+            (header_length,) = HEADER_LENGTH.unpack_from(data, len(MAGIC))
+            data += f.read(header_length)
+        header = _header_cache[path] = _parse_header(path, data)
+    return header
+
+
+class SegmentReader:
+    """メモリマップしたセグメントファイル"""
+
+    def __init__(self, path: str, header: Optional[SegmentHeader] = None):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.header = header or _parse_header(path, self._mmap)
+        self.rows = self.header.rows
+        self.columns = self.header.columns
+
+    def has_patient(self, patient_id: int) -> bool:
+        return self.header.has_patient(patient_id)
+
+    def column(self, name: str) -> List[Any]:
+        """列を展開して値のリストを返します"""
+        column = self.columns[name]
+        start = self.header.data_start + column["offset"]
+        data = zlib.decompress(self._mmap[start:start + column["length"]])
+        return _decode_column(column["type"], data, self.rows, column.get("dictionary"))
+
+    def select(self, name: str, values: Collection[Any]) -> List[Dict[str, Any]]:
+        """指定した列が値のいずれかに一致する行を返します（一致する行がある場合のみ他の列を展開）"""
+        matches = [i for i, v in enumerate(self.column(name)) if v in values]
+        if not matches:
+            return []
+        columns = {column_name: self.column(column_name) for column_name in self.columns}
+        return [
+            {column_name: column_values[i] for column_name, column_values in columns.items()}
+            for i in matches
+        ]
+
+    def close(self):
+        self._mmap.close()
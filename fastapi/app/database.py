@@ -16,13 +16,20 @@ DATABASE_URL = os.getenv(
     "mysql+pymysql://root:p0ssw0rd@db:3306/psyexam"
 )
 
+# コネクションプールの設定
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+
+# SQL文のログ出力（既定では無効）
+SQL_ECHO = os.getenv("SQL_ECHO", "false").lower() in ("1", "true", "on")
+
 # SQLAlchemyエンジンの作成
-logger.debug(f"Creating database engine with URL: {DATABASE_URL}")
+logger.debug("Creating database engine (pool_size=%d, max_overflow=%d)", POOL_SIZE, MAX_OVERFLOW)
 engine = create_engine(
     DATABASE_URL,
-    pool_size=5,
-    max_overflow=10,
-    echo=True
+    pool_size=POOL_SIZE,
+    max_overflow=MAX_OVERFLOW,
+    echo=SQL_ECHO
 )
 
 # セッションの作成
@@ -0,0 +1,184 @@
+"""
+レスポンスのエンコーディング（Acceptヘッダーによるコンテンツネゴシエーション）
+
+一覧系のエンドポイントは、Acceptヘッダーに応じて以下の形式で結果を返します:
+
+- application/json (既定): 従来通りのJSON
+- application/msgpack: MessagePack（msgpack がインストールされている場合）
+- application/vnd.psyexam.columnar+json: キー辞書を共有した列指向JSON
+
+列指向JSONでは、"気分/感情" や "severity" のように繰り返し現れるキーを
+先頭の keys にまとめ、本体ではその番号で参照します:
+
+    {"format": "columnar", "keys": ["id", "severity", ...], "data": <ノード>}
+
+ノードの形式:
+- 同じキー構成の空でない辞書のリスト (2件以上):
+  {"@t": [キー番号...], "@n": 行数, "@c": [列ごとのノード...]}
+  （各列は値のリストをノードとして再帰的に表現したもの）
+- 重複のある文字列のリスト: {"@e": [重複のない値...], "@x": [値の番号...]}
+  （重症度や解釈文など、同じ文字列が繰り返し現れる列）
+- 辞書: {"@o": [キー番号...], "@v": [値のノード...]}
+- リスト: 要素のノードのリスト
+- それ以外: 値そのもの
+
+元の形式に戻すには decode_columnar() を使います。
+"""
+
+import json
+from typing import Dict, Any, List, Optional
+
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+
+try:
+    import msgpack
+except ImportError:  # msgpack が無い環境ではJSONのみ
+    msgpack = None
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+COLUMNAR_JSON = "application/vnd.psyexam.columnar+json"
+
+# Acceptヘッダーで受け付けるメディアタイプ (別名を含む)
+MEDIA_TYPES = {
+    JSON: JSON,
+    MSGPACK: MSGPACK,
+    "application/x-msgpack": MSGPACK,
+    COLUMNAR_JSON: COLUMNAR_JSON,
+}
+
+
+def negotiate(accept: Optional[str]) -> str:
+    """
+    Acceptヘッダーから返却するメディアタイプを決定します。
+
+    q値の高い順に対応しているものを選び、該当がなければJSONを返します。
+    """
+    if not accept:
+        return JSON
+
+    candidates = []
+    for position, part in enumerate(accept.split(",")):
+        media_type, *params = [piece.strip() for piece in part.split(";")]
+        quality = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        candidates.append((-quality, position, media_type.lower()))
+
+    for negative_quality, _, media_type in sorted(candidates):
+        if negative_quality == 0:
+            break
+        resolved = MEDIA_TYPES.get(media_type)
+        if resolved == MSGPACK and msgpack is None:
+            continue
+        if resolved:
+            return resolved
+    return JSON
+
+
+class _KeyTable:
+    """キー文字列と番号の対応表"""
+
+    def __init__(self):
+        self.keys: List[str] = []
+        self.index: Dict[str, int] = {}
+
+    def id(self, key: str) -> int:
+        key_id = self.index.get(key)
+        if key_id is None:
+            key_id = self.index[key] = len(self.keys)
+            self.keys.append(key)
+        return key_id
+
+
+def _encode_node(node: Any, keys: _KeyTable) -> Any:
+    if isinstance(node, dict):
+        return {
+            "@o": [keys.id(key) for key in node],
+            "@v": [_encode_node(value, keys) for value in node.values()]
+        }
+    if isinstance(node, list):
+        if len(node) >= 2:
+            first = node[0]
+            if isinstance(first, dict):
+                columns = list(first)
+                if columns and all(isinstance(item, dict) and list(item) == columns for item in node):
+                    return {
+                        "@t": [keys.id(key) for key in columns],
+                        "@n": len(node),
+                        "@c": [_encode_node([item[key] for item in node], keys) for key in columns]
+                    }
+            elif isinstance(first, str) and all(isinstance(item, str) for item in node):
+                values: Dict[str, int] = {}
+                codes = [values.setdefault(item, len(values)) for item in node]
+                if len(values) < len(node):
+                    return {"@e": list(values), "@x": codes}
+                return node
+        return [_encode_node(item, keys) for item in node]
+    return node
+
+
+def encode_columnar(payload: Any) -> Dict[str, Any]:
+    """JSON互換の値を列指向JSONの形式に変換します"""
+    keys = _KeyTable()
+    data = _encode_node(payload, keys)
+    return {"format": "columnar", "keys": keys.keys, "data": data}
+
+
+def _decode_node(node: Any, keys: List[str]) -> Any:
+    if isinstance(node, dict):
+        if "@e" in node:
+            return [node["@e"][code] for code in node["@x"]]
+        if "@t" in node:
+            columns = [_decode_node(column, keys) for column in node["@c"]]
+            names = [keys[key_id] for key_id in node["@t"]]
+            if not columns:
+                return [{} for _ in range(node["@n"])]
+            return [dict(zip(names, row)) for row in zip(*columns)]
+        return {
+            keys[key_id]: _decode_node(value, keys)
+            for key_id, value in zip(node["@o"], node["@v"])
+        }
+    if isinstance(node, list):
+        return [_decode_node(item, keys) for item in node]
+    return node
+
+
+def decode_columnar(document: Dict[str, Any]) -> Any:
+    """列指向JSONを元の形式に戻します"""
+    return _decode_node(document["data"], document["keys"])
+
+
+def encode_body(payload: Any, media_type: str) -> bytes:
+    """JSON互換の値を指定したメディアタイプのバイト列に変換します"""
+    if media_type == MSGPACK:
+        return msgpack.packb(payload, use_bin_type=True)
+    if media_type == COLUMNAR_JSON:
+        payload = encode_columnar(payload)
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def negotiated_response(request: Request, payload: Any, status_code: int = 200) -> Response:
+    """
+    Acceptヘッダーに応じた形式でレスポンスを作成します。
+
+    payload には辞書やPydanticモデルを渡せます（日時などはJSON互換の値に変換されます）。
+    """
+    media_type = negotiate(request.headers.get("accept"))
+    content = jsonable_encoder(payload)
+    headers = {"Vary": "Accept"}
+    if media_type == JSON:
+        return JSONResponse(content=content, status_code=status_code, headers=headers)
+    return Response(
+        content=encode_body(content, media_type),
+        status_code=status_code,
+        media_type=media_type,
+        headers=headers
+    )
+
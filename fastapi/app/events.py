@@ -0,0 +1,208 @@
+"""
+解析完了イベントのプロセス内Pub/Sub
+
+解析処理 (単体・検査セット) が解析結果を保存した時点でイベントを発行し、
+Server-Sent Events のエンドポイントを通じて購読中のダッシュボードに配信します。
+
+- イベントIDは "<起動ID>-<連番>" の形式で、直近 EVENT_HISTORY_SIZE 件を履歴として保持します。
+  再接続時に Last-Event-ID を送ると、その後のイベントを履歴から再送します。
+  起動IDはプロセスの起動ごとに変わるため、再起動前のIDで再接続した場合は
+  連番が振り直されていても resync を返します。
+- 購読者ごとのバッファは EVENT_SUBSCRIBER_BUFFER 件までで、溢れた購読者は切断されます
+  （遅い購読者が解析処理を遅らせることはありません）。切断された購読者は
+  Last-Event-ID で再接続すれば取りこぼしなく再開できます。
+- スレッドから発行した場合は、イベントループのスレッドに引き渡して配信します。
+"""
+
+import asyncio
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+import itertools
+import logging
+import os
+import threading
+import uuid
+from typing import Dict, Any, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# 再送用に保持するイベント数
+EVENT_HISTORY_SIZE = int(os.getenv("EVENT_HISTORY_SIZE", "1000"))
+
+# 購読者ごとのバッファの上限
+EVENT_SUBSCRIBER_BUFFER = int(os.getenv("EVENT_SUBSCRIBER_BUFFER", "100"))
+
+# 同時に接続できる購読者数の上限
+EVENT_MAX_SUBSCRIBERS = int(os.getenv("EVENT_MAX_SUBSCRIBERS", "100"))
+
+ANALYSIS_COMPLETED = "analysis.completed"
+
+
+@dataclass
+class Event:
+    seq: int
+    id: str
+    type: str
+    data: Dict[str, Any]
+
+
+@dataclass(eq=False)
+class Subscription:
+    """購読者ごとの絞り込み条件とバッファ"""
+    patient_id: Optional[int] = None
+    exam_id: Optional[int] = None
+    queue: asyncio.Queue = field(default_factory=lambda: asyncio.Queue(EVENT_SUBSCRIBER_BUFFER))
+    overflowed: bool = False
+
+    def matches(self, event: Event) -> bool:
+        if self.patient_id is not None and event.data.get("patient_id") != self.patient_id:
+            return False
+        if self.exam_id is not None and event.data.get("exam_id") != self.exam_id:
+            return False
+        return True
+
+
+class TooManySubscribers(Exception):
+    """購読者数が上限に達している場合の例外"""
+
+
+class EventBroker:
+    """イベントの発行・履歴・購読者への配信を管理します"""
+
+    def __init__(self, history_size: int, max_subscribers: int):
+        self.history: deque = deque(maxlen=history_size)
+        self.max_subscribers = max_subscribers
+        self.subscriptions: Set[Subscription] = set()
+        self.dropped = 0
+        # プロセスの起動ごとに異なるID（再起動をまたいだ Last-Event-ID を判別するため）
+        self.boot_id = uuid.uuid4().hex[:12]
+        self._seqs = itertools.count(1)
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def is_full(self) -> bool:
+        """購読者数が上限に達しているかを返します"""
+        return len(self.subscriptions) >= self.max_subscribers
+
+    def subscribe(self, patient_id: Optional[int] = None, exam_id: Optional[int] = None) -> Subscription:
+        """購読を開始します。イベントループのスレッドから呼び出してください"""
+        if self.is_full():
+            raise TooManySubscribers()
+        self._loop = asyncio.get_running_loop()
+        subscription = Subscription(patient_id=patient_id, exam_id=exam_id)
+        self.subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self.subscriptions.discard(subscription)
+
+    def event_id(self, seq: int) -> str:
+        return f"{self.boot_id}-{seq}"
+
+    def latest_seq(self) -> int:
+        """最後に発行したイベントの連番を返します（未発行の場合は0）"""
+        with self._lock:
+            return self.history[-1].seq if self.history else 0
+
+    def parse_event_id(self, event_id: str) -> Optional[int]:
+        """
+        イベントIDから連番を取り出します。
+
+        Returns:
+            連番、または別の起動で発行されたIDや不正なIDの場合はNone
+        """
+        boot_id, _, seq = event_id.rpartition("-")
+        if boot_id != self.boot_id or not seq.isdigit():
+            return None
+        return int(seq)
+
+    def replay(self, subscription: Subscription, last_event_id: str) -> Optional[List[Event]]:
+        """
+        指定したID以降の、購読条件に一致するイベントを履歴から返します。
+
+        Returns:
+            イベントのリスト、または再開できない場合はNone
+            （履歴が既に失われている場合や、再起動前に発行されたIDの場合）
+        """
+        last_seq = self.parse_event_id(last_event_id)
+        if last_seq is None:
+            return None
+        with self._lock:
+            history = list(self.history)
+        latest_seq = history[-1].seq if history else 0
+        if last_seq > latest_seq:
+            return None
+        if history and history[0].seq > last_seq + 1:
+            return None
+        return [
+            event for event in history
+            if event.seq > last_seq and subscription.matches(event)
+        ]
+
+    def publish(self, event_type: str, data: Dict[str, Any]) -> Event:
+        """イベントを発行します。どのスレッドからでも呼び出せます"""
+        with self._lock:
+            seq = next(self._seqs)
+            event = Event(seq=seq, id=self.event_id(seq), type=event_type, data=data)
+            self.history.append(event)
+
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return event
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self._dispatch(event)
+        else:
+            loop.call_soon_threadsafe(self._dispatch, event)
+        return event
+
+    def _dispatch(self, event: Event):
+        for subscription in list(self.subscriptions):
+            if subscription.overflowed or not subscription.matches(event):
+                continue
+            try:
+                subscription.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # 遅い購読者は切断し、Last-Event-ID での再接続に任せる
+                subscription.overflowed = True
+                self.dropped += 1
+                self.unsubscribe(subscription)
+                logger.warning("イベントのバッファが溢れたため購読者を切断しました")
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "subscribers": len(self.subscriptions),
+            "history": len(self.history),
+            "last_event_id": self.history[-1].id if self.history else None,
+            "dropped_subscribers": self.dropped
+        }
+
+
+broker = EventBroker(EVENT_HISTORY_SIZE, EVENT_MAX_SUBSCRIBERS)
+
+
+def publish_analysis_completed(analysis, exam_name: str, source: str) -> Event:
+    """
+    解析完了イベントを発行します。
+
+    Args:
+        analysis: 保存済みの解析結果 (models.AnalysisResult または schemas.AnalysisResultResponse)
+        exam_name: 検査名
+        source: 発行元 (analyze / exam_set)
+    """
+    created_at = analysis.created_at or datetime.now()
+    return broker.publish(ANALYSIS_COMPLETED, {
+        "analysis_id": analysis.id,
+        "result_id": analysis.result_id,
+        "patient_id": analysis.patient_id,
+        "exam_id": analysis.exam_id,
+        "exam_name": exam_name,
+        "total_score": analysis.total_score,
+        "severity": analysis.severity,
+        "created_at": created_at.isoformat(),
+        "source": source
+    })
@@ -0,0 +1,201 @@
+"""
+ロギング設定モジュール
+
+リクエスト処理の遅延にならないよう、ログ出力を以下のように構成します:
+
+- ログレコードはキュー (QueueHandler) に積むだけで、標準出力への書き込みは
+  別スレッドの QueueListener が行う
+- 出力は1行1レコードのJSON（LOG_FORMAT=text で従来の形式）で、リクエストIDを含む
+- DEBUGレベルのログはリクエスト単位で有効化し、通常は LOG_DEBUG_SAMPLE_RATE の
+  割合のリクエストだけを出力する。X-Debug-Log: 1 ヘッダーを付けたリクエストは
+  常に詳細ログを出力する
+- ロガーのレベルは LOG_LEVEL のままとし、詳細ログが有効なリクエストかどうかは
+  ロガーのレベル判定 (isEnabledFor) で確認するため、出力しないレコードは作成されない
+
+ログの呼び出し側は logger.debug("... %s", value) のように遅延フォーマットを使い、
+出力されないレコードの文字列組み立てを避けてください。
+"""
+
+import atexit
+from contextvars import ContextVar
+from datetime import datetime, timezone
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import uuid
+from typing import Optional
+
+# 出力するログレベル（リクエスト単位の詳細ログを除く）
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+
+# 出力形式 (json / text)
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+
+# DEBUGログを出力するリクエストの割合 (0.0〜1.0)
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "0.0"))
+
+# 詳細ログを有効にするリクエストヘッダー
+DEBUG_HEADER = "x-debug-log"
+
+# リクエストIDのヘッダー
+REQUEST_ID_HEADER = "x-request-id"
+
+# 現在のリクエストのIDと詳細ログの有効・無効
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+debug_enabled_var: ContextVar[bool] = ContextVar("debug_enabled", default=False)
+
+# リクエスト単位の詳細ログの対象とするロガー（アプリケーションのロガーのみ）
+REQUEST_DEBUG_LOGGER_PREFIX = "app"
+
+# LogRecordの標準属性とuvicornの端末用 color_message（extraで渡された項目を判別するため）
+_RESERVED_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "color_message"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class RequestDebugLogger(logging.Logger):
+    """
+    詳細ログが有効なリクエストの処理中だけ、LOG_LEVEL 未満のレベルも有効とするロガー
+
+    通常のレベル判定（キャッシュ付き）で棄却される場合にのみコンテキスト変数を確認するため、
+    出力しない logger.debug() の呼び出しはレコードを作成する前に戻ります。
+    """
+
+    def isEnabledFor(self, level: int) -> bool:
+        if super().isEnabledFor(level):
+            return True
+        return (
+            debug_enabled_var.get()
+            and level > self.manager.disable
+            and (self.name == REQUEST_DEBUG_LOGGER_PREFIX
+                 or self.name.startswith(REQUEST_DEBUG_LOGGER_PREFIX + "."))
+        )
+
+
+class RequestContextFilter(logging.Filter):
+    """
+    レコードにリクエストIDを付与し、詳細ログが無効なリクエストのDEBUGレコードを捨てます。
+    """
+
+    def __init__(self, level: int):
+        super().__init__()
+        self.level = level
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < self.level and not debug_enabled_var.get():
+            return False
+        record.request_id = request_id_var.get()
+        return True
+
+
+class JSONFormatter(logging.Formatter):
+    """ログレコードを1行のJSONに変換します"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        # extra で渡された構造化フィールド
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and key != "request_id":
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _PassThroughQueueHandler(logging.handlers.QueueHandler):
+    """
+    レコードをそのままキューに積むQueueHandler
+
+    標準の QueueHandler.prepare() は呼び出し元スレッドでメッセージを整形するため、
+    整形処理もリスナー側のスレッドに任せます。
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def setup_logging():
+    """
+    ルートロガーにキュー経由の非同期ハンドラーを設定します。
+
+    既に設定済みの場合は何もしません。
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    level = getattr(logging, LOG_LEVEL, logging.INFO)
+
+    stream_handler = logging.StreamHandler()
+    if LOG_FORMAT == "json":
+        stream_handler.setFormatter(JSONFormatter())
+    else:
+        stream_handler.setFormatter(logging.Formatter(
+            "%(asctime)s [%(levelname)s] [%(request_id)s] %(message)s"
+        ))
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = _PassThroughQueueHandler(log_queue)
+    queue_handler.addFilter(RequestContextFilter(level))
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(level)
+
+    # 以降に作成されるロガーと、作成済みのアプリケーションのロガーで
+    # リクエスト単位の詳細ログを有効にする（RequestDebugLogger は属性を追加しないため置き換えられる）
+    logging.setLoggerClass(RequestDebugLogger)
+    for name, existing in list(logging.Logger.manager.loggerDict.items()):
+        if (type(existing) is logging.Logger
+                and (name == REQUEST_DEBUG_LOGGER_PREFIX
+                     or name.startswith(REQUEST_DEBUG_LOGGER_PREFIX + "."))):
+            existing.__class__ = RequestDebugLogger
+
+    # ライブラリの冗長なログは警告以上のみ出力（SQL文は SQL_ECHO で有効化）
+    for name in ("sqlalchemy", "httpx", "httpcore", "asyncio"):
+        logging.getLogger(name).setLevel(max(level, logging.WARNING))
+
+    # uvicorn は独自の同期 StreamHandler を持ち propagate=False のため、
+    # ハンドラーを外してルートロガー（キュー）に流す。アクセスログはミドルウェアが
+    # 1リクエスト1行で出力するため、uvicorn のアクセスログはレコードを作らせない
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers = []
+        uvicorn_logger.propagate = True
+    logging.getLogger("uvicorn.access").setLevel(max(level, logging.WARNING))
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """キューに残っているログを出力してリスナーを停止します"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def new_request_id(header_value: Optional[str]) -> str:
+    """リクエストヘッダーのIDを引き継ぐか、新しいリクエストIDを発行します"""
+    if header_value and len(header_value) <= 128:
+        return header_value
+    return uuid.uuid4().hex
+
+
+def should_debug(header_value: Optional[str]) -> bool:
+    """リクエストの詳細ログを出力するかを判定します"""
+    if header_value and header_value.lower() in ("1", "true", "on"):
+        return True
+    return LOG_DEBUG_SAMPLE_RATE > 0 and random.random() < LOG_DEBUG_SAMPLE_RATE
@@ -0,0 +1,278 @@
+"""
+事前計算ルックアップテーブルパッケージ
+
+回答の取りうる値が少ない検査 (例: PHQ-9 は 9項目×0〜3点 = 4^9 = 262,144 通り) では、
+解析結果が回答ベクトルだけで決まるため、全ての回答ベクトルに対する解析結果を
+事前に計算してファイルに保存し、実行時は表引きで結果を返すことができます。
+
+対象の解析モジュールには、回答の定義域を LOOKUP_DOMAIN として定義します:
+
+    LOOKUP_DOMAIN = {"items": ["item0", ..., "item8"], "values": [0, 1, 2, 3]}
+
+テーブルファイル (<モジュール名>.lut) の構成:
+
+- マジック (8バイト) とヘッダー長 (4バイト、リトルエンディアン)
+- ヘッダー (JSON): 項目、値の最小値と基数、出力のひな形、回答によって変わる
+  値の位置 (paths)、値の一覧 (pool、重複なし)
+- レコード: 回答ベクトルを基数 k で符号化した番号の順に、
+  各 path の値の pool 内番号を 1 または 2 バイトで並べたもの
+
+レコード部はメモリマップで参照するため、プロセス間でページキャッシュを共有し、
+起動時の読み込みも発生しません。解釈文などの文字列は pool で共有されます。
+
+PHQ-9 程度の解析関数では、辞書の組み立ては解析そのものと同程度の時間がかかり、
+保存時の json.dumps(details) の方が高くつきます。そのため表引きの結果には、
+pool の各値のJSON表現から組み立てた details のJSON文字列 (DETAILS_JSON) を添え、
+保存時は dump_details() で json.dumps を省きます。
+
+テーブルの作成と検証:
+    python -m app.lookup.build phq-9
+    python -m app.lookup.build phq-9 --verify
+"""
+
+import json
+import logging
+import mmap
+from operator import itemgetter
+import os
+import re
+import struct
+from typing import Dict, Any, Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# テーブルファイルの配置ディレクトリ
+LOOKUP_TABLE_DIR = os.getenv(
+    "LOOKUP_TABLE_DIR",
+    os.path.join(os.path.dirname(__file__), "data")
+)
+
+MAGIC = b"PSYLUT\x00\x01"
+HEADER_LENGTH = struct.Struct("<I")
+
+# 表引きの結果に添える、事前にシリアライズした details のキー
+# 値は (json.dumps(details) と同じ文字列, 表引き時点の details の項目数)
+DETAILS_JSON = "details_json"
+
+# _compile_json_format で可変位置の代わりに埋め込む文字列のJSON表現
+_LEAF_MARKER = re.compile(r'"\\u0000(\d+)\\u0000"')
+
+
+class _Leaf:
+    """ひな形の中で回答によって値が変わる位置を表すマーカー"""
+
+    __slots__ = ("index",)
+
+    def __init__(self, index: int):
+        self.index = index
+
+
+def _compile_node(node: Any) -> Optional[Callable[[List[Any]], Any]]:
+    """
+    ひな形のノードを、値のリストからそのノードの出力を組み立てる関数に変換します。
+
+    回答によって変わらないスカラーはひな形の値をそのまま使うためNoneを返します。
+    辞書・リストはひな形の浅いコピーに変わる位置の値だけを書き込むため、
+    キーの順序はひな形と同じになります。
+    """
+    if isinstance(node, _Leaf):
+        return itemgetter(node.index)
+    if isinstance(node, (dict, list)):
+        positions = node.items() if isinstance(node, dict) else enumerate(node)
+        children = [(position, _compile_node(value)) for position, value in positions]
+        children = [(position, build) for position, build in children if build is not None]
+
+        def build_container(values: List[Any]) -> Any:
+            output = node.copy()
+            for position, build in children:
+                output[position] = build(values)
+            return output
+        return build_container
+    return None
+
+
+def _compile_template(template: Any) -> Callable[[List[Any]], Any]:
+    """
+    ひな形を、値のリストから新しい出力を組み立てる関数に変換します。
+
+    出力は呼び出し元で変更されうるため、辞書・リストは毎回新しく作ります。
+    """
+    build = _compile_node(template)
+    if build is None:
+        return lambda values: template
+    return build
+
+
+def _compile_json_format(node: Any) -> Tuple[str, List[int]]:
+    """
+    ひな形のノードを、json.dumps(ノードの出力) と同じ文字列を組み立てる % 書式に変換します。
+
+    Returns:
+        (書式文字列, 各 %s に入る可変位置の番号のリスト)
+        %s には可変位置の値のJSON表現を文字列中の順に当てはめます。
+    """
+    def mark(value: Any) -> Any:
+        if isinstance(value, _Leaf):
+            return f"\x00{value.index}\x00"
+        if isinstance(value, dict):
+            return {key: mark(child) for key, child in value.items()}
+        if isinstance(value, list):
+            return [mark(child) for child in value]
+        return value
+
+    parts = _LEAF_MARKER.split(json.dumps(mark(node)).replace("%", "%%"))
+    return "%s".join(parts[0::2]), [int(index) for index in parts[1::2]]
+
+
+def table_path(module_name: str, directory: Optional[str] = None) -> str:
+    """テーブルファイルのパスを返します"""
+    return os.path.join(directory or LOOKUP_TABLE_DIR, f"{module_name}.lut")
+
+
+class LookupTable:
+    """メモリマップしたルックアップテーブル"""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} はルックアップテーブルではありません")
+        (header_length,) = HEADER_LENGTH.unpack_from(self._mmap, len(MAGIC))
+        header_start = len(MAGIC) + HEADER_LENGTH.size
+        header = json.loads(self._mmap[header_start:header_start + header_length])
+
+        self.exam = header["exam"]
+        self.items: List[str] = header["items"]
+        self.min_value: int = header["min_value"]
+        self.base: int = header["base"]
+        self.width: int = header["width"]
+        self.record_size: int = self.width * len(header["paths"])
+        self.data_offset: int = header["data_offset"]
+        self.pool: List[Any] = header["pool"]
+        self._format = struct.Struct("<" + ("B" if self.width == 1 else "H") * len(header["paths"]))
+
+        # ひな形の可変位置をマーカーに置き換えて、出力を組み立てる関数を作成
+        template = header["template"]
+        for leaf_index, keys in enumerate(header["paths"]):
+            node = template
+            for key in keys[:-1]:
+                node = node[key]
+            node[keys[-1]] = _Leaf(leaf_index)
+        self._build = _compile_template(template)
+
+        # details のJSON文字列を組み立てる書式と、pool の各値のJSON表現
+        self._details_format: Optional[str] = None
+        self._details_leaves: List[int] = []
+        if isinstance(template, dict) and isinstance(template.get("details"), dict):
+            self._details_format, self._details_leaves = _compile_json_format(template["details"])
+        self._pool_json: List[str] = [json.dumps(value) for value in self.pool]
+
+        expected_size = self.data_offset + self.base ** len(self.items) * self.record_size
+        if len(self._mmap) != expected_size:
+            raise ValueError(f"{path} のサイズが不正です")
+
+    def encode(self, result_data: Dict[str, Any]) -> Optional[int]:
+        """
+        回答ベクトルを基数 k の番号に変換します。
+
+        Returns:
+            レコード番号、または欠損・範囲外の項目がある場合はNone
+        """
+        index = 0
+        scale = 1
+        for item_key in self.items:
+            value = result_data.get(item_key)
+            if not isinstance(value, int):
+                return None
+            digit = value - self.min_value
+            if not 0 <= digit < self.base:
+                return None
+            index += digit * scale
+            scale *= self.base
+        return index
+
+    def lookup(self, result_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        事前計算された解析結果を返します。
+
+        Returns:
+            解析結果の辞書 (details があれば DETAILS_JSON を含む)、
+            または表引きできない回答の場合はNone
+        """
+        index = self.encode(result_data)
+        if index is None:
+            return None
+        codes = self._format.unpack_from(self._mmap, self.data_offset + index * self.record_size)
+        pool = self.pool
+        analysis_result = self._build([pool[code] for code in codes])
+        if self._details_format is not None:
+            pool_json = self._pool_json
+            analysis_result[DETAILS_JSON] = (
+                self._details_format % tuple([pool_json[codes[leaf]] for leaf in self._details_leaves]),
+                len(analysis_result["details"])
+            )
+        return analysis_result
+
+    def close(self):
+        self._mmap.close()
+
+
+# 読み込み済みのテーブル (モジュール名 → LookupTable または None)
+_tables: Dict[str, Optional[LookupTable]] = {}
+
+
+def get_table(module_name: str) -> Optional[LookupTable]:
+    """モジュール名に対応するテーブルを返します（ファイルがなければNone）"""
+    if module_name not in _tables:
+        path = table_path(module_name)
+        table = None
+        if os.path.exists(path):
+            try:
+                table = LookupTable(path)
+                logger.info("ルックアップテーブル %s を読み込みました", path)
+            except (OSError, ValueError, KeyError, IndexError, TypeError) as e:
+                logger.error("ルックアップテーブル %s の読み込みに失敗しました: %s", path, str(e))
+        _tables[module_name] = table
+    return _tables[module_name]
+
+
+def with_lookup(module_name: str, analyzer_func: Callable) -> Callable:
+    """
+    テーブルがある場合は表引きし、表引きできない回答 (欠損項目を含むなど) は
+    元の解析関数で計算する関数を返します。テーブルがなければ元の関数をそのまま返します。
+    """
+    table = get_table(module_name)
+    if table is None:
+        return analyzer_func
+
+    def lookup_analyzer(result_data: Dict[str, Any]) -> Dict[str, Any]:
+        analysis_result = table.lookup(result_data)
+        if analysis_result is None:
+            return analyzer_func(result_data)
+        return analysis_result
+
+    lookup_analyzer.__name__ = analyzer_func.__name__
+    lookup_analyzer.__doc__ = analyzer_func.__doc__
+    return lookup_analyzer
+
+
+def dump_details(analysis_result: Dict[str, Any]) -> str:
+    """
+    解析結果の details を json.dumps と同じJSON文字列に変換します。
+
+    表引きした結果は DETAILS_JSON の文字列を使い、表引きの後に追加された項目
+    (基準値 norms など) だけをシリアライズして末尾に連結します。
+    既存の項目を書き換えた場合は DETAILS_JSON を削除してください。
+    """
+    details = analysis_result["details"]
+    serialized = analysis_result.get(DETAILS_JSON)
+    if serialized is None:
+        return json.dumps(details)
+
+    text, n_items = serialized
+    if len(details) == n_items:
+        return text
+    added = json.dumps(dict(list(details.items())[n_items:]))
+    separator = ", " if n_items else ""
+    return text[:-1] + separator + added[1:]
@@ -0,0 +1,202 @@
+"""
+ルックアップテーブルの作成・検証ジョブ
+
+解析モジュールの LOOKUP_DOMAIN に含まれる全ての回答ベクトルについて解析関数を実行し、
+結果をテーブルファイルに書き出します。--verify を指定すると、既存のテーブルを
+元の解析関数の結果と全件照合します。
+
+使い方:
+    python -m app.lookup.build phq-9 [--output DIR]
+    python -m app.lookup.build phq-9 --verify
+"""
+
+import argparse
+from array import array
+from importlib import import_module
+import itertools
+import json
+import logging
+import os
+import sys
+from typing import Dict, Any, List, Tuple
+
+from . import MAGIC, HEADER_LENGTH, LOOKUP_TABLE_DIR, DETAILS_JSON, LookupTable, table_path
+
+logger = logging.getLogger(__name__)
+
+# テーブルに含める回答ベクトル数の上限
+MAX_ENTRIES = 2 ** 24
+
+
+def load_analyzer(exam_type: str):
+    """解析関数と回答の定義域を取得します"""
+    module_name = exam_type.replace("-", "_").lower()
+    module = import_module(f"app.analyzers.{module_name}")
+    domain = getattr(module, "LOOKUP_DOMAIN", None)
+    if domain is None:
+        raise ValueError(f"{module_name} には LOOKUP_DOMAIN が定義されていません")
+    return module_name, getattr(module, module_name), domain
+
+
+def iter_vectors(items: List[str], values: List[int]):
+    """全ての回答ベクトルを (レコード番号, 回答データ) の組で列挙します"""
+    base = len(values)
+    for digits in itertools.product(range(base), repeat=len(items)):
+        # 最初の項目を最下位桁とする
+        index = 0
+        for digit in reversed(digits):
+            index = index * base + digit
+        yield index, {item: values[digit] for item, digit in zip(items, digits)}
+
+
+def flatten(node: Any, prefix: Tuple = ()) -> List[Tuple[Tuple, Any]]:
+    """出力を (辞書キーのパス, 値) の一覧に展開します（辞書以外は葉として扱う）"""
+    if isinstance(node, dict):
+        leaves = []
+        for key, value in node.items():
+            leaves.extend(flatten(value, prefix + (key,)))
+        return leaves
+    return [(prefix, node)]
+
+
+def build(exam_type: str, output_dir: str) -> str:
+    """
+    ルックアップテーブルを作成します。
+
+    Returns:
+        作成したファイルのパス
+    """
+    module_name, analyzer_func, domain = load_analyzer(exam_type)
+    items, values = domain["items"], domain["values"]
+    if values != list(range(values[0], values[0] + len(values))):
+        raise ValueError("LOOKUP_DOMAIN の values は連続した整数である必要があります")
+
+    n_entries = len(values) ** len(items)
+    if n_entries > MAX_ENTRIES:
+        raise ValueError(f"回答ベクトルが {n_entries} 通りあり、事前計算の上限を超えています")
+
+    logger.info("%s の %d 通りの回答を解析します", module_name, n_entries)
+
+    pool_index: Dict[str, int] = {}
+    pool: List[Any] = []
+    paths = None
+    template = None
+    codes = None
+
+    for index, result_data in iter_vectors(items, values):
+        analysis_result = analyzer_func(result_data)
+        leaves = flatten(analysis_result)
+        if paths is None:
+            paths = [path for path, _ in leaves]
+            template = analysis_result
+            codes = array("I", bytes(4 * len(paths) * n_entries))
+        elif [path for path, _ in leaves] != paths:
+            raise ValueError("出力の構造が回答によって異なるため事前計算できません")
+
+        offset = index * len(paths)
+        for position, (_, value) in enumerate(leaves):
+            key = json.dumps(value, ensure_ascii=False, sort_keys=True)
+            code = pool_index.get(key)
+            if code is None:
+                code = pool_index[key] = len(pool)
+                pool.append(value)
+            codes[offset + position] = code
+
+    # 全ての回答で同じ値の位置はひな形に残し、変わる位置だけをレコードに格納する
+    n_paths = len(paths)
+    variable = [
+        position for position in range(n_paths)
+        if any(codes[i * n_paths + position] != codes[position] for i in range(1, n_entries))
+    ]
+    used_codes = sorted({codes[i * n_paths + p] for i in range(n_entries) for p in variable})
+    remap = {code: new_code for new_code, code in enumerate(used_codes)}
+    width = 1 if len(used_codes) <= 0xFF else 2
+    if len(used_codes) > 0xFFFF:
+        raise ValueError("値の種類が多すぎるため事前計算できません")
+
+    records = array("B" if width == 1 else "H")
+    for i in range(n_entries):
+        offset = i * n_paths
+        records.extend(remap[codes[offset + p]] for p in variable)
+    if sys.byteorder != "little":
+        records.byteswap()
+
+    header = {
+        "exam": exam_type,
+        "items": items,
+        "min_value": values[0],
+        "base": len(values),
+        "width": width,
+        "template": template,
+        "paths": [list(paths[p]) for p in variable],
+        "pool": [pool[code] for code in used_codes],
+    }
+    # ヘッダー長はデータ開始位置に依存するため、確定するまで計算し直す
+    header["data_offset"] = 0
+    while True:
+        header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+        data_offset = len(MAGIC) + HEADER_LENGTH.size + len(header_bytes)
+        if header["data_offset"] == data_offset:
+            break
+        header["data_offset"] = data_offset
+
+    os.makedirs(output_dir, exist_ok=True)
+    path = table_path(module_name, output_dir)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(HEADER_LENGTH.pack(len(header_bytes)))
+        f.write(header_bytes)
+        f.write(records.tobytes())
+    os.replace(tmp_path, path)
+
+    logger.info(
+        "%s を作成しました (%d 件 × %d バイト、値 %d 種類)",
+        path, n_entries, width * len(variable), len(used_codes)
+    )
+    return path
+
+
+def verify(exam_type: str, directory: str) -> int:
+    """
+    テーブルの全レコードを元の解析関数の結果と照合します。
+
+    Returns:
+        不一致の件数
+    """
+    module_name, analyzer_func, domain = load_analyzer(exam_type)
+    table = LookupTable(table_path(module_name, directory))
+    mismatches = 0
+    try:
+        for _, result_data in iter_vectors(domain["items"], domain["values"]):
+            analysis_result = table.lookup(result_data)
+            expected = analyzer_func(result_data)
+            serialized = analysis_result.pop(DETAILS_JSON, None)
+            if analysis_result != expected or (
+                serialized is not None and serialized[0] != json.dumps(expected["details"])
+            ):
+                mismatches += 1
+                if mismatches <= 10:
+                    logger.error("不一致: %s", result_data)
+    finally:
+        table.close()
+
+    logger.info("%s の検証が完了しました: 不一致 %d 件", module_name, mismatches)
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="解析結果のルックアップテーブルを作成・検証します")
+    parser.add_argument("exam", help="検査タイプ名 (例: phq-9)")
+    parser.add_argument("--output", default=LOOKUP_TABLE_DIR, help="テーブルの出力先ディレクトリ")
+    parser.add_argument("--verify", action="store_true", help="既存のテーブルを解析関数の結果と照合する")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    if args.verify:
+        sys.exit(1 if verify(args.exam, args.output) else 0)
+    build(args.exam, args.output)
+
+
+if __name__ == "__main__":
+    main()
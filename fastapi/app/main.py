@@ -1,20 +1,22 @@
 from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
+import asyncio
 import logging
+import time
 from sqlalchemy import text
 
-from . import models
+from . import models, norms, search
+from .admission import controller as admission_controller
+from .events import broker as event_broker
+from .logging_config import (
+    setup_logging, new_request_id, should_debug,
+    request_id_var, debug_enabled_var, REQUEST_ID_HEADER, DEBUG_HEADER
+)
 from .database import engine, SessionLocal
-from .routers import analysis
+from .routers import analysis, triage, events, search as search_router
 
-# ロギングの設定
-logging.basicConfig(
-    level=logging.DEBUG,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    handlers=[
-        logging.StreamHandler()
-    ]
-)
+# ロギングの設定（キュー経由でJSON出力）
+setup_logging()
 logger = logging.getLogger(__name__)
 
 # FastAPIアプリケーションの初期化
@@ -30,18 +32,36 @@ app.add_middleware(
     allow_origins=["*"],  # すべてのオリジンを許可
     allow_credentials=False,  # 認証情報を含むリクエストでないのでFalseに
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS", "PATCH"],  # 明示的にメソッドを列挙
-    allow_headers=["Content-Type", "Authorization", "Accept"],  # 一般的に必要なヘッダーを列挙
-    expose_headers=["Content-Type"],  # レスポンスで公開するヘッダー
+    allow_headers=["Content-Type", "Authorization", "Accept", "X-Request-ID", "X-Debug-Log", "Last-Event-ID"],  # 一般的に必要なヘッダーを列挙
+    expose_headers=["Content-Type", "X-Request-ID"],  # レスポンスで公開するヘッダー
     max_age=600,  # プリフライトリクエストの結果をキャッシュする時間(秒)
 )
 
-# CORSデバッグログの追加
+# リクエストIDの付与とアクセスログ
+# X-Debug-Log: 1 ヘッダーを付けたリクエストはヘッダーを含む詳細ログを出力
 @app.middleware("http")
 async def log_requests(request, call_next):
-    logger.debug(f"Incoming request: {request.method} {request.url}")
-    logger.debug(f"Request headers: {request.headers}")
+    request_id = new_request_id(request.headers.get(REQUEST_ID_HEADER))
+    request_id_var.set(request_id)
+    debug_enabled_var.set(should_debug(request.headers.get(DEBUG_HEADER)))
+
+    start = time.perf_counter()
+    logger.debug("Incoming request: %s %s", request.method, request.url)
+    logger.debug("Request headers: %s", request.headers)
     response = await call_next(request)
-    logger.debug(f"Response status: {response.status_code}")
+    duration_ms = (time.perf_counter() - start) * 1000
+
+    response.headers["X-Request-ID"] = request_id
+    logger.info(
+        "%s %s %d",
+        request.method, request.url.path, response.status_code,
+        extra={
+            "method": request.method,
+            "path": request.url.path,
+            "status": response.status_code,
+            "duration_ms": round(duration_ms, 2)
+        }
+    )
     return response
 
 # データベースのテーブル作成
@@ -52,17 +72,28 @@ def startup_event():
         # テーブルを作成
         models.Base.metadata.create_all(bind=engine)
         logger.debug("Database tables created successfully")
+
+        # 規準テーブルの読み込み
+        norms.load_norms()
         
         # データベース接続をテスト
         with engine.connect() as conn:
             conn.execute(text("SELECT 1"))
             logger.debug("Database connection test successful")
     except Exception as e:
-        logger.error(f"Error during startup: {str(e)}")
+        logger.error("Error during startup: %s", e)
         raise e
 
+# 検索インデックスの差分更新を開始
+@app.on_event("startup")
+async def start_search_indexer():
+    app.state.search_indexer = asyncio.create_task(search.run_indexer())
+
 # ルーターの登録
 app.include_router(analysis.router, prefix="/api", tags=["analysis"])
+app.include_router(search_router.router, prefix="/api", tags=["search"])
+app.include_router(triage.router, prefix="/api", tags=["triage"])
+app.include_router(events.router, prefix="/api", tags=["events"])
 
 # ヘルスチェックエンドポイント
 @app.get("/")
@@ -71,4 +102,14 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"}
\ No newline at end of file
+    return {"status": "healthy"}
+
+# アドミッション制御の状態（待ち行列の長さ・棄却数）
+@app.get("/metrics/admission")
+async def admission_metrics():
+    return admission_controller.metrics()
+
+# 解析完了イベントの購読状況
+@app.get("/metrics/events")
+async def event_metrics():
+    return event_broker.metrics()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, Text, Float
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Boolean, Text, Float, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 import json
@@ -101,4 +101,94 @@ class AnalysisResult(Base):
                 return json.loads(self.details)
             except json.JSONDecodeError:
                 return {}
-        return {}
\ No newline at end of file
+        return {}
+
+# 既存のテーブル構造を再定義（読み取り用）：検査セット
+class ExamSet(Base):
+    __tablename__ = "exam_sets"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(255), unique=True, index=True)
+    description = Column(String(1000), nullable=True)
+    created_at = Column(DateTime, default=func.now())
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+    # リレーション
+    items = relationship("ExamSetItem", back_populates="exam_set")
+
+
+class ExamSetItem(Base):
+    __tablename__ = "exam_set_items"
+
+    id = Column(Integer, primary_key=True, index=True)
+    exam_set_id = Column(Integer, ForeignKey("exam_sets.id", ondelete="CASCADE"))
+    exam_id = Column(Integer, ForeignKey("exams.id", ondelete="CASCADE"))
+    created_at = Column(DateTime, default=func.now())
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+    # リレーション
+    exam_set = relationship("ExamSet", back_populates="items")
+    exam = relationship("Exam")
+
+
+# 新規テーブル：自由記述の全文検索用ドキュメント
+class ResultSearchDocument(Base):
+    __tablename__ = "result_search_documents"
+
+    result_id = Column(Integer, ForeignKey("results.id", ondelete="CASCADE"), primary_key=True)
+    patient_id = Column(Integer, index=True)
+    exam_id = Column(Integer)
+
+    # 検査結果の作成日時（日付での絞り込み用）
+    result_created_at = Column(DateTime)
+
+    # free0〜free4 を連結した本文
+    body = Column(Text)
+
+    indexed_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        # MySQLでは日本語に対応したngramパーサーのFULLTEXTインデックスを作成
+        Index(
+            "ix_result_search_documents_body",
+            "body",
+            mysql_prefix="FULLTEXT",
+            mysql_with_parser="ngram"
+        ),
+        Index("ix_result_search_documents_created", "result_created_at"),
+    )
+
+
+# 新規テーブル：リスクトリアージ
+class TriageFlag(Base):
+    __tablename__ = "triage_flags"
+
+    id = Column(Integer, primary_key=True, index=True)
+    analysis_id = Column(Integer, ForeignKey("analysis_results.id", ondelete="CASCADE"), index=True)
+    result_id = Column(Integer)
+    patient_id = Column(Integer)
+    exam_id = Column(Integer)
+
+    # リスクの種類 (suicidal_ideation: 自殺念慮, severe: 重度)
+    reason = Column(String(50))
+
+    # 一覧表示用に解析結果の値を複製して保持（結合なしで返すため）
+    total_score = Column(Float)
+    severity = Column(String(50), nullable=True)
+
+    # 確認状況
+    acknowledged = Column(Boolean, default=False, nullable=False)
+    acknowledged_at = Column(DateTime, nullable=True)
+    acknowledged_by = Column(String(255), nullable=True)
+
+    created_at = Column(DateTime, default=func.now())
+
+    # リレーション
+    analysis = relationship("AnalysisResult")
+
+    __table_args__ = (
+        # 未確認のフラグを新しい順に索引走査するためのインデックス
+        Index("ix_triage_flags_queue", "acknowledged", "id"),
+        # 患者で絞り込んだ未確認のフラグを新しい順に索引走査するためのインデックス
+        Index("ix_triage_flags_patient_queue", "patient_id", "acknowledged", "id"),
+    )
@@ -0,0 +1,232 @@
+"""
+規準（ノルム）テーブルパッケージ
+
+検査ごとの規準テーブルを性別・年齢帯で層別化して保持し、
+合計スコアのパーセンタイル順位とTスコアを返します。
+
+規準テーブルは検査名と同名のJSONファイル (例: PHQ-9.json) として
+NORMS_DIR に配置し、起動時に load_norms() で読み込みます。
+ファイルの形式は以下の通りです:
+
+    {
+        "exam": "PHQ-9",
+        "strata": [
+            {"sex": 1, "age_band": "20-29", "values": [0, 1, 2], "counts": [40, 25, 18]},
+            {"sex": null, "age_band": null, "values": [...], "counts": [...]}
+        ]
+    }
+
+values は昇順に並んだスコア、counts はそのスコアの人数です。
+sex と age_band が null の層は全体（層別なし）の規準として扱われ、
+該当する層がない場合のフォールバックに使われます。
+読み込み時に値と累積度数をコンパクトな配列に変換し、
+参照時は二分探索のみで結果を返すため、データベースへの問い合わせは発生しません。
+
+規準テーブルは rebuild モジュールのバッチジョブにより、
+蓄積された analysis_results から再計算することもできます。
+"""
+
+from array import array
+from bisect import bisect_left
+from datetime import datetime
+import json
+import logging
+import math
+import os
+from typing import Dict, Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 規準テーブルの配置ディレクトリ
+NORMS_DIR = os.getenv(
+    "NORMS_DIR",
+    os.path.join(os.path.dirname(__file__), "data")
+)
+
+# 年齢帯の境界 (下限, 上限) ※上限は含まない
+AGE_BANDS: List[Tuple[int, int]] = [
+    (0, 20), (20, 30), (30, 40), (40, 50), (50, 60), (60, 70), (70, 200)
+]
+
+# 層のキー (性別, 年齢帯)。どちらもNoneの場合は全体の規準
+StratumKey = Tuple[Optional[int], Optional[str]]
+
+
+def age_band_label(lower: int, upper: int) -> str:
+    """年齢帯のラベルを返します (例: "20-29"、"70-")"""
+    if upper >= 200:
+        return f"{lower}-"
+    return f"{lower}-{upper - 1}"
+
+
+def get_age_band(age: Optional[int]) -> Optional[str]:
+    """年齢が属する年齢帯のラベルを返します"""
+    if age is None:
+        return None
+    for lower, upper in AGE_BANDS:
+        if lower <= age < upper:
+            return age_band_label(lower, upper)
+    return None
+
+
+def calculate_age(birthdate: Optional[datetime], on: Optional[datetime] = None) -> Optional[int]:
+    """基準日 (省略時は現在) 時点の満年齢を計算します"""
+    if birthdate is None:
+        return None
+    on = on or datetime.now()
+    age = on.year - birthdate.year
+    if (on.month, on.day) < (birthdate.month, birthdate.day):
+        age -= 1
+    return age
+
+
+class NormStratum:
+    """
+    1つの層の規準分布
+
+    昇順のスコア値と累積度数を配列で保持し、二分探索で順位を求めます。
+    """
+
+    __slots__ = ("values", "cumulative", "n", "mean", "sd")
+
+    def __init__(self, values: List[float], counts: List[int]):
+        if len(values) != len(counts):
+            raise ValueError("values と counts の長さが一致しません")
+
+        pairs = sorted(zip(values, counts))
+        self.values = array("d", (value for value, _ in pairs))
+        self.cumulative = array("q")
+        running = 0
+        total = 0.0
+        for value, count in pairs:
+            running += count
+            total += value * count
+            self.cumulative.append(running)
+        self.n = running
+
+        self.mean = total / self.n if self.n else 0.0
+        variance = sum(
+            count * (value - self.mean) ** 2 for value, count in pairs
+        ) / self.n if self.n else 0.0
+        self.sd = math.sqrt(variance)
+
+    def percentile(self, score: float) -> Optional[float]:
+        """
+        スコアのパーセンタイル順位 (0〜100) を返します。
+
+        同点は中間順位として扱います: (下回る人数 + 同点人数 / 2) / 全体人数
+        """
+        if not self.n:
+            return None
+        index = bisect_left(self.values, score)
+        below = self.cumulative[index - 1] if index > 0 else 0
+        equal = 0
+        if index < len(self.values) and self.values[index] == score:
+            equal = self.cumulative[index] - below
+        return (below + equal / 2) / self.n * 100
+
+    def t_score(self, score: float) -> Optional[float]:
+        """スコアのTスコア (平均50、標準偏差10) を返します"""
+        if not self.n or self.sd == 0:
+            return None
+        return 50 + 10 * (score - self.mean) / self.sd
+
+
+class NormTable:
+    """検査1つ分の規準テーブル（層の集合）"""
+
+    def __init__(self, exam_name: str, strata: Dict[StratumKey, NormStratum]):
+        self.exam_name = exam_name
+        self.strata = strata
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "NormTable":
+        """JSONから読み込んだ辞書から規準テーブルを構築します"""
+        strata = {}
+        for entry in data.get("strata", []):
+            key = (entry.get("sex"), entry.get("age_band"))
+            strata[key] = NormStratum(entry["values"], entry["counts"])
+        return cls(data["exam"], strata)
+
+    def find_stratum(self, sex: Optional[int], age: Optional[int]) -> Tuple[Optional[StratumKey], Optional[NormStratum]]:
+        """性別・年齢に該当する層を探します。なければ全体の規準を返します"""
+        for key in ((sex, get_age_band(age)), (None, None)):
+            stratum = self.strata.get(key)
+            if stratum is not None and stratum.n:
+                return key, stratum
+        return None, None
+
+    def lookup(self, score: float, sex: Optional[int], age: Optional[int]) -> Optional[Dict[str, Any]]:
+        """スコアのパーセンタイル順位とTスコアを返します"""
+        key, stratum = self.find_stratum(sex, age)
+        if stratum is None:
+            return None
+
+        percentile = stratum.percentile(score)
+        t_score = stratum.t_score(score)
+        return {
+            "percentile": round(percentile, 1) if percentile is not None else None,
+            "t_score": round(t_score, 1) if t_score is not None else None,
+            "sex": key[0],
+            "age_band": key[1],
+            "n": stratum.n
+        }
+
+
+# 読み込み済みの規準テーブル (検査名 → NormTable)
+_norm_tables: Dict[str, NormTable] = {}
+
+
+def load_norms(directory: Optional[str] = None) -> int:
+    """
+    ディレクトリ内の規準テーブルを全て読み込みます。
+
+    Returns:
+        読み込んだ規準テーブルの数
+    """
+    directory = directory or NORMS_DIR
+    tables = {}
+
+    if not os.path.isdir(directory):
+        logger.info("規準テーブルのディレクトリ %s がありません。規準参照は無効です", directory)
+    else:
+        for filename in sorted(os.listdir(directory)):
+            if not filename.endswith(".json"):
+                continue
+            path = os.path.join(directory, filename)
+            try:
+                with open(path, encoding="utf-8") as f:
+                    table = NormTable.from_dict(json.load(f))
+                tables[table.exam_name.lower()] = table
+            except (OSError, ValueError, KeyError) as e:
+                logger.error("規準テーブル %s の読み込みに失敗しました: %s", path, e)
+
+    _norm_tables.clear()
+    _norm_tables.update(tables)
+    logger.info("規準テーブルを %d 件読み込みました", len(tables))
+    return len(tables)
+
+
+def get_norm_table(exam_name: str) -> Optional[NormTable]:
+    """検査名に対応する規準テーブルを返します"""
+    return _norm_tables.get(exam_name.lower())
+
+
+def lookup(
+    exam_name: str,
+    score: float,
+    sex: Optional[int],
+    birthdate: Optional[datetime],
+    on: Optional[datetime] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    検査名と患者属性からスコアの規準参照結果を返します。
+
+    Returns:
+        percentile, t_score, 使用した層 (sex, age_band) と人数 n を含む辞書。
+        規準テーブルがない場合はNone
+    """
+    table = get_norm_table(exam_name)
+    if table is None:
+        return None
+    return table.lookup(score, sex, calculate_age(birthdate, on))
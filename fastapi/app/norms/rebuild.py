@@ -0,0 +1,201 @@
+"""
+規準テーブルの再計算バッチジョブ
+
+蓄積された analysis_results の合計スコアを性別・年齢帯ごとに集計し、
+検査ごとの規準テーブルJSONを出力します。
+年齢は受検日時点の満年齢で計算します。
+経過観察で何度も受検している患者に分布が偏らないよう、
+患者・検査ごとに最新の解析結果1件だけを集計します。
+アーカイブ (app.archive) に移動した解析結果も集計に含めます。
+
+使い方:
+    python -m app.norms.rebuild [--output DIR] [--min-count N]
+"""
+
+import argparse
+from collections import Counter, defaultdict
+import json
+import logging
+import os
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import func
+
+from .. import archive, models
+from ..database import SessionLocal
+from . import NORMS_DIR, StratumKey, calculate_age, get_age_band
+
+logger = logging.getLogger(__name__)
+
+# 結果を少しずつ読み込むためのバッチサイズ
+FETCH_SIZE = 10000
+
+# アーカイブの結果に対応する検査結果を取得する際の、1回のクエリあたりのID数
+ARCHIVE_FETCH_SIZE = 1000
+
+
+def collect_archived_latest() -> Dict[Tuple[int, int], Tuple[int, int, float]]:
+    """
+    アーカイブの解析結果から、患者・検査ごとに最新 (IDが最大) の1件を求めます。
+
+    Returns:
+        (患者ID, 検査ID) をキー、(解析結果ID, 検査結果ID, 合計スコア) を値とする辞書
+    """
+    latest: Dict[Tuple[int, int], Tuple[int, int, float]] = {}
+    rows = archive.scan_analyses(["id", "result_id", "patient_id", "exam_id", "total_score"])
+    for analysis_id, result_id, patient_id, exam_id, total_score in rows:
+        if total_score is None:
+            continue
+        key = (patient_id, exam_id)
+        current = latest.get(key)
+        if current is None or current[0] < analysis_id:
+            latest[key] = (analysis_id, result_id, total_score)
+    return latest
+
+
+def collect_distributions(db) -> Dict[str, Dict[StratumKey, Counter]]:
+    """
+    解析結果から検査・層ごとのスコア度数分布を集計します。
+
+    アーカイブに移動した解析結果も含め、ホットテーブルとアーカイブを合わせて
+    患者・検査ごとに最新の1件を選びます。ホットテーブルの結果はストリーミングで
+    読み込み、アーカイブ側は患者・検査ごとの最新の1件だけをメモリに保持します。
+    """
+    distributions: Dict[str, Dict[StratumKey, Counter]] = defaultdict(lambda: defaultdict(Counter))
+
+    def add(exam_name: str, total_score: float, taken_at, sex, birthdate):
+        age_band = get_age_band(calculate_age(birthdate, taken_at))
+        strata = distributions[exam_name]
+        strata[(sex, age_band)][total_score] += 1
+        strata[(None, None)][total_score] += 1
+
+    archived = collect_archived_latest()
+
+    # 患者・検査ごとの最新の解析結果（ホットテーブル）
+    latest = (
+        db.query(func.max(models.AnalysisResult.id).label("id"))
+        .filter(models.AnalysisResult.total_score.isnot(None))
+        .group_by(models.AnalysisResult.patient_id, models.AnalysisResult.exam_id)
+        .subquery()
+    )
+
+    rows = (
+        db.query(
+            models.AnalysisResult.id,
+            models.AnalysisResult.patient_id,
+            models.AnalysisResult.exam_id,
+            models.Exam.examname,
+            models.AnalysisResult.total_score,
+            models.Result.created_at,
+            models.Patient.sex,
+            models.Patient.birthdate
+        )
+        .join(latest, latest.c.id == models.AnalysisResult.id)
+        .join(models.Result, models.Result.id == models.AnalysisResult.result_id)
+        .join(models.Exam, models.Exam.id == models.AnalysisResult.exam_id)
+        .join(models.Patient, models.Patient.id == models.AnalysisResult.patient_id)
+        .yield_per(FETCH_SIZE)
+    )
+
+    for analysis_id, patient_id, exam_id, exam_name, total_score, created_at, sex, birthdate in rows:
+        key = (patient_id, exam_id)
+        archived_latest = archived.get(key)
+        if archived_latest is not None and archived_latest[0] > analysis_id:
+            # アーカイブ側の方が新しい（未確認のフラグで古い結果がホットに残っている場合など）
+            continue
+        archived.pop(key, None)
+        add(exam_name, total_score, created_at, sex, birthdate)
+
+    # ホットテーブルより新しいアーカイブの結果は、受検日時と患者情報を検査結果から取得
+    exam_names = dict(db.query(models.Exam.id, models.Exam.examname))
+    pending = {
+        result_id: (exam_id, total_score)
+        for (_, exam_id), (_, result_id, total_score) in archived.items()
+    }
+    result_ids = sorted(pending)
+    for start in range(0, len(result_ids), ARCHIVE_FETCH_SIZE):
+        results = (
+            db.query(
+                models.Result.id,
+                models.Result.created_at,
+                models.Patient.sex,
+                models.Patient.birthdate
+            )
+            .join(models.Patient, models.Patient.id == models.Result.patient_id)
+            .filter(models.Result.id.in_(result_ids[start:start + ARCHIVE_FETCH_SIZE]))
+        )
+        for result_id, created_at, sex, birthdate in results:
+            exam_id, total_score = pending[result_id]
+            if exam_id in exam_names:
+                add(exam_names[exam_id], total_score, created_at, sex, birthdate)
+
+    return distributions
+
+
+def write_norm_tables(
+    distributions: Dict[str, Dict[StratumKey, Counter]],
+    output_dir: str,
+    min_count: int
+) -> int:
+    """
+    集計した度数分布を検査ごとのJSONファイルに書き出します。
+
+    人数が min_count に満たない層は不安定なため出力しません。
+
+    Returns:
+        書き出したファイルの数
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    written = 0
+
+    for exam_name, strata in distributions.items():
+        entries = []
+        for (sex, age_band), counter in strata.items():
+            if sum(counter.values()) < min_count:
+                continue
+            values = sorted(counter)
+            entries.append({
+                "sex": sex,
+                "age_band": age_band,
+                "values": values,
+                "counts": [counter[value] for value in values]
+            })
+
+        if not entries:
+            logger.warning("%s は十分な件数の層がないため規準テーブルを出力しません", exam_name)
+            continue
+
+        path = os.path.join(output_dir, f"{exam_name}.json")
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"exam": exam_name, "strata": entries}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        written += 1
+        logger.info("%s の規準テーブルを %s に出力しました (%d 層)", exam_name, path, len(entries))
+
+    return written
+
+
+def rebuild(output_dir: Optional[str] = None, min_count: int = 30) -> int:
+    """解析結果から規準テーブルを再計算して出力します"""
+    db = SessionLocal()
+    try:
+        distributions = collect_distributions(db)
+    finally:
+        db.close()
+    return write_norm_tables(distributions, output_dir or NORMS_DIR, min_count)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="解析結果から規準テーブルを再計算します")
+    parser.add_argument("--output", default=NORMS_DIR, help="規準テーブルの出力先ディレクトリ")
+    parser.add_argument("--min-count", type=int, default=30, help="層ごとに必要な最小人数")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    written = rebuild(args.output, args.min_count)
+    logger.info("規準テーブルを %d 件出力しました", written)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from sqlalchemy import func
+from sqlalchemy.orm import Session, joinedload
 from sqlalchemy.exc import SQLAlchemyError
+import asyncio
 import json
 import logging
-from typing import Dict, Any
+from datetime import datetime
+from typing import Dict, Any, List, Optional
 
 from .. import schemas, models
 from ..database import get_db
+from ..admission import admit
+from ..encoding import negotiated_response
+from ..events import publish_analysis_completed
 from ..analyzers import get_analyzer
+from ..lookup import dump_details
+from .. import norms, archive
+from ..triage import build_triage_flags
 
 # ロギングの設定
 logger = logging.getLogger(__name__)
@@ -19,10 +28,12 @@ router = APIRouter()
     "/analyze/{result_id}",
     response_model=schemas.AnalysisResultResponse,
     status_code=status.HTTP_201_CREATED,
+    dependencies=[Depends(admit("analyze"))],
     responses={
         404: {"model": schemas.HTTPError, "description": "検査結果が見つかりません"},
         400: {"model": schemas.HTTPError, "description": "解析エラー"},
-        500: {"model": schemas.HTTPError, "description": "サーバーエラー"}
+        500: {"model": schemas.HTTPError, "description": "サーバーエラー"},
+        503: {"model": schemas.HTTPError, "description": "サーバーが混雑しています"}
     }
 )
 async def analyze_result(
@@ -34,8 +45,10 @@ async def analyze_result(
     
     既に解析結果が存在する場合は、それを返します。
     """
-    # 検査結果の取得
-    result = db.query(models.Result).filter(models.Result.id == result_id).first()
+    # 検査結果の取得（規準参照に使う患者情報も同じクエリで読み込む）
+    result = db.query(models.Result).options(
+        joinedload(models.Result.patient)
+    ).filter(models.Result.id == result_id).first()
     if not result:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -47,23 +60,16 @@ async def analyze_result(
         models.AnalysisResult.result_id == result_id
     ).first()
     
+    if existing_analysis is None:
+        # アーカイブ済みの解析結果も既存の結果として扱う
+        archived = await asyncio.to_thread(archive.find_by_result_id, result_id)
+        if archived is not None:
+            existing_analysis = models.AnalysisResult(**archived)
+
     if existing_analysis:
         # 既存の解析結果がある場合はそれを返す
-        logger.info(f"ID {result_id} の既存の解析結果を返します")
-        # details_dictプロパティを使用するために一度辞書に変換してからモデルを作成
-        analysis_dict = {
-            "id": existing_analysis.id,
-            "result_id": existing_analysis.result_id,
-            "patient_id": existing_analysis.patient_id,
-            "exam_id": existing_analysis.exam_id,
-            "total_score": existing_analysis.total_score,
-            "details": existing_analysis.details_dict,  # JSON文字列を辞書に変換
-            "interpretation": existing_analysis.interpretation,
-            "severity": existing_analysis.severity,
-            "created_at": existing_analysis.created_at,
-            "updated_at": existing_analysis.updated_at
-        }
-        return schemas.AnalysisResultResponse(**analysis_dict)
+        logger.debug("ID %d の既存の解析結果を返します", result_id)
+        return to_analysis_response(existing_analysis)
     
     # 検査タイプの取得
     exam = db.query(models.Exam).filter(models.Exam.id == result.exam_id).first()
@@ -87,6 +93,7 @@ async def analyze_result(
         
         # 解析実行
         analysis_result = analyzer_func(result_data)
+        attach_norms(analysis_result, exam.examname, result.patient, result.created_at)
         
         # 解析結果をデータベースに保存
         db_analysis = models.AnalysisResult(
@@ -94,54 +101,224 @@ async def analyze_result(
             patient_id=result.patient_id,
             exam_id=result.exam_id,
             total_score=analysis_result["total_score"],
-            details=json.dumps(analysis_result["details"]),
+            details=dump_details(analysis_result),
             interpretation=analysis_result["interpretation"],
             severity=analysis_result.get("severity")
         )
         
         db.add(db_analysis)
+        db.add_all(build_triage_flags(db_analysis, exam.examname, analysis_result))
         db.commit()
         db.refresh(db_analysis)
         
-        logger.info(f"ID {result_id} の検査結果の解析を完了しました")
-        # details_dictプロパティを使用するために一度辞書に変換してからモデルを作成
-        analysis_dict = {
-            "id": db_analysis.id,
-            "result_id": db_analysis.result_id,
-            "patient_id": db_analysis.patient_id,
-            "exam_id": db_analysis.exam_id,
-            "total_score": db_analysis.total_score,
-            "details": db_analysis.details_dict,  # JSON文字列を辞書に変換
-            "interpretation": db_analysis.interpretation,
-            "severity": db_analysis.severity,
-            "created_at": db_analysis.created_at,
-            "updated_at": db_analysis.updated_at
-        }
-        return schemas.AnalysisResultResponse(**analysis_dict)
+        logger.info("ID %d の検査結果の解析を完了しました", result_id)
+        publish_analysis_completed(db_analysis, exam.examname, source="analyze")
+        return to_analysis_response(db_analysis)
     
     except Exception as e:
         db.rollback()
-        logger.error(f"解析エラー: {str(e)}")
+        logger.error("解析エラー: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"解析処理中にエラーが発生しました: {str(e)}"
         )
 
 
+@router.post(
+    "/analyze/exam-sets/{exam_set_id}/patients/{patient_id}",
+    response_model=schemas.ExamSetAnalysisResponse,
+    status_code=status.HTTP_200_OK,
+    dependencies=[Depends(admit("batch"))],
+    responses={
+        404: {"model": schemas.HTTPError, "description": "患者または検査セットが見つかりません"},
+        500: {"model": schemas.HTTPError, "description": "サーバーエラー"},
+        503: {"model": schemas.HTTPError, "description": "サーバーが混雑しています"}
+    }
+)
+async def analyze_exam_set(
+    exam_set_id: int,
+    patient_id: int,
+    request: Request,
+    db: Session = Depends(get_db)
+):
+    """
+    検査セットに含まれる全ての検査について、患者の最新の検査結果をまとめて解析します。
+
+    Acceptヘッダーで MessagePack や列指向JSONを指定できます (app.encoding を参照)。
+
+    検査結果と既存の解析結果は検査セット単位で一括取得するため、
+    発行するクエリ数は患者の受検履歴の量に依存しません。
+    未解析の結果は解析モジュールを並列に実行し、一度のコミットで保存します。
+    """
+    patient = db.query(models.Patient).filter(models.Patient.id == patient_id).first()
+    if not patient:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"ID {patient_id} の患者が見つかりません"
+        )
+
+    exam_set = db.query(models.ExamSet).filter(models.ExamSet.id == exam_set_id).first()
+    if not exam_set:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"ID {exam_set_id} の検査セットが見つかりません"
+        )
+
+    try:
+        # 検査セットの構成検査を一括取得
+        exams = (
+            db.query(models.Exam)
+            .join(models.ExamSetItem, models.ExamSetItem.exam_id == models.Exam.id)
+            .filter(models.ExamSetItem.exam_set_id == exam_set_id)
+            .order_by(models.ExamSetItem.id)
+            .all()
+        )
+        exam_ids = [exam.id for exam in exams]
+
+        # 検査ごとの最新結果と既存の解析結果を一括取得
+        latest_results = load_latest_results(db, patient_id, exam_ids)
+        result_ids = [result.id for result in latest_results.values()]
+        existing_analyses = load_existing_analyses(db, result_ids)
+
+        # ホットテーブルにない結果は、アーカイブ済みの解析結果を既存の結果として扱う
+        missing_ids = [result_id for result_id in result_ids if result_id not in existing_analyses]
+        if missing_ids:
+            archived_rows = await asyncio.to_thread(archive.find_by_result_ids, missing_ids)
+            for result_id, row in archived_rows.items():
+                existing_analyses[result_id] = models.AnalysisResult(**row)
+
+        sections: Dict[int, schemas.ExamSetSection] = {}
+        pending = []
+        for exam in exams:
+            result = latest_results.get(exam.id)
+            if result is None:
+                sections[exam.id] = schemas.ExamSetSection(
+                    exam_id=exam.id,
+                    exam_name=exam.examname,
+                    status="no_result",
+                    message="この検査の結果がありません"
+                )
+                continue
+
+            existing = existing_analyses.get(result.id)
+            if existing is not None:
+                sections[exam.id] = schemas.ExamSetSection(
+                    exam_id=exam.id,
+                    exam_name=exam.examname,
+                    status="existing",
+                    analysis=to_analysis_response(existing)
+                )
+                continue
+
+            analyzer_func = get_analyzer(exam.examname)
+            if not analyzer_func:
+                sections[exam.id] = schemas.ExamSetSection(
+                    exam_id=exam.id,
+                    exam_name=exam.examname,
+                    status="unsupported",
+                    message=f"検査タイプ '{exam.examname}' の解析モジュールが見つかりません"
+                )
+                continue
+
+            pending.append((exam, result, analyzer_func))
+
+        # 未解析の結果は解析モジュールを並列に実行
+        outcomes = await asyncio.gather(
+            *(
+                asyncio.to_thread(analyzer_func, prepare_result_data(result))
+                for _, result, analyzer_func in pending
+            ),
+            return_exceptions=True
+        )
+
+        # 作成日時はここで確定させ、保存後の再読み込みクエリを発生させない
+        # （単体の解析と同じくデータベースの時計・タイムゾーンに合わせるため、NOW() を1回だけ取得）
+        now = db.query(func.now()).scalar() if pending else None
+        new_analyses = []
+        for (exam, result, _), outcome in zip(pending, outcomes):
+            if isinstance(outcome, Exception):
+                logger.error("解析エラー (result_id=%s): %s", result.id, outcome)
+                sections[exam.id] = schemas.ExamSetSection(
+                    exam_id=exam.id,
+                    exam_name=exam.examname,
+                    status="error",
+                    message=f"解析処理中にエラーが発生しました: {str(outcome)}"
+                )
+                continue
+
+            attach_norms(outcome, exam.examname, patient, result.created_at)
+            db_analysis = models.AnalysisResult(
+                result_id=result.id,
+                patient_id=result.patient_id,
+                exam_id=result.exam_id,
+                total_score=outcome["total_score"],
+                details=dump_details(outcome),
+                interpretation=outcome["interpretation"],
+                severity=outcome.get("severity"),
+                created_at=now,
+                updated_at=now
+            )
+            new_analyses.append((exam, db_analysis))
+            db.add_all(build_triage_flags(db_analysis, exam.examname, outcome))
+
+        if new_analyses:
+            db.add_all([db_analysis for _, db_analysis in new_analyses])
+            db.flush()
+            for exam, db_analysis in new_analyses:
+                sections[exam.id] = schemas.ExamSetSection(
+                    exam_id=exam.id,
+                    exam_name=exam.examname,
+                    status="analyzed",
+                    analysis=to_analysis_response(db_analysis)
+                )
+            db.commit()
+
+            # コミット後の再読み込みを避けるため、レスポンス用の値からイベントを発行
+            for exam, _ in new_analyses:
+                publish_analysis_completed(
+                    sections[exam.id].analysis, exam.examname, source="exam_set"
+                )
+
+        logger.info(
+            "検査セット %d (患者ID %d) の解析を完了しました: 新規 %d 件",
+            exam_set_id, patient_id, len(new_analyses)
+        )
+        return negotiated_response(request, schemas.ExamSetAnalysisResponse(
+            exam_set_id=exam_set.id,
+            exam_set_name=exam_set.name,
+            patient_id=patient_id,
+            sections=[sections[exam.id] for exam in exams]
+        ))
+
+    except SQLAlchemyError as e:
+        db.rollback()
+        logger.error("データベースエラー: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="検査セットの解析中にエラーが発生しました"
+        )
+
+
 @router.get(
     "/analysis-results/{patient_id}",
     status_code=status.HTTP_200_OK,
+    dependencies=[Depends(admit("read"))],
     responses={
         404: {"model": schemas.HTTPError, "description": "患者が見つかりません"},
-        500: {"model": schemas.HTTPError, "description": "サーバーエラー"}
+        500: {"model": schemas.HTTPError, "description": "サーバーエラー"},
+        503: {"model": schemas.HTTPError, "description": "サーバーが混雑しています"}
     }
 )
 async def get_patient_analysis_results(
     patient_id: int,
+    request: Request,
     db: Session = Depends(get_db)
 ):
     """
     指定された患者の全ての解析結果を取得します。
+
+    アーカイブ済みの古い解析結果も含めて、解析結果ID順に返します。
+    Acceptヘッダーで MessagePack や列指向JSONを指定できます (app.encoding を参照)。
     """
     # 患者の存在確認
     patient = db.query(models.Patient).filter(models.Patient.id == patient_id).first()
@@ -152,15 +329,31 @@ async def get_patient_analysis_results(
         )
     
     try:
-        # 解析結果の取得
+        # 解析結果の取得（ホットテーブルとアーカイブ）
         analysis_results = db.query(models.AnalysisResult).filter(
             models.AnalysisResult.patient_id == patient_id
         ).all()
+        hot_ids = {analysis.id for analysis in analysis_results}
+        archived_rows = await asyncio.to_thread(archive.find_patient_analyses, patient_id)
+        # アーカイブ処理の途中で両方に存在する行はホット側を優先
+        archived_analyses = [
+            models.AnalysisResult(**row) for row in archived_rows
+            if row["id"] not in hot_ids
+        ]
+        
+        # 検査情報を一括で取得
+        exam_ids = {analysis.exam_id for analysis in analysis_results + archived_analyses}
+        exams = {
+            exam.id: exam for exam in
+            db.query(models.Exam).filter(models.Exam.id.in_(exam_ids)).all()
+        } if exam_ids else {}
         
         # 検査情報を付加
         results_with_exams = []
-        for analysis in analysis_results:
-            exam = db.query(models.Exam).filter(models.Exam.id == analysis.exam_id).first()
+        entries = [(analysis, False) for analysis in analysis_results]
+        entries += [(analysis, True) for analysis in archived_analyses]
+        for analysis, archived in sorted(entries, key=lambda entry: entry[0].id):
+            exam = exams.get(analysis.exam_id)
             if exam:
                 analysis_dict = {
                     "id": analysis.id,
@@ -171,20 +364,21 @@ async def get_patient_analysis_results(
                     "severity": analysis.severity,
                     "interpretation": analysis.interpretation,
                     "details": json.loads(analysis.details) if analysis.details else {},
-                    "created_at": analysis.created_at
+                    "created_at": analysis.created_at,
+                    "archived": archived
                 }
                 results_with_exams.append(analysis_dict)
         
-        return {"analysis_results": results_with_exams}
+        return negotiated_response(request, {"analysis_results": results_with_exams})
     
     except SQLAlchemyError as e:
-        logger.error(f"データベースエラー: {str(e)}")
+        logger.error("データベースエラー: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="解析結果の取得中にエラーが発生しました"
         )
     except Exception as e:
-        logger.error(f"予期しないエラー: {str(e)}")
+        logger.error("予期しないエラー: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"解析結果の処理中にエラーが発生しました: {str(e)}"
@@ -194,9 +388,11 @@ async def get_patient_analysis_results(
 @router.delete(
     "/analysis-results/{analysis_id}",
     status_code=status.HTTP_204_NO_CONTENT,
+    dependencies=[Depends(admit("analyze"))],
     responses={
         404: {"model": schemas.HTTPError, "description": "解析結果が見つかりません"},
-        500: {"model": schemas.HTTPError, "description": "サーバーエラー"}
+        500: {"model": schemas.HTTPError, "description": "サーバーエラー"},
+        503: {"model": schemas.HTTPError, "description": "サーバーが混雑しています"}
     }
 )
 async def delete_analysis_result(
@@ -219,7 +415,7 @@ async def delete_analysis_result(
         return None
     except SQLAlchemyError as e:
         db.rollback()
-        logger.error(f"解析結果削除エラー: {str(e)}")
+        logger.error("解析結果削除エラー: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="解析結果の削除中にエラーが発生しました"
@@ -245,4 +441,100 @@ def prepare_result_data(result: models.Result) -> Dict[str, Any]:
         if hasattr(result, free_key):
             result_data[free_key] = getattr(result, free_key)
     
-    return result_data
\ No newline at end of file
+    return result_data
+
+
+def to_analysis_response(analysis: models.AnalysisResult) -> schemas.AnalysisResultResponse:
+    """
+    解析結果モデルをレスポンススキーマに変換します。
+
+    details_dictプロパティを使用するために一度辞書に変換してからモデルを作成します。
+    """
+    analysis_dict = {
+        "id": analysis.id,
+        "result_id": analysis.result_id,
+        "patient_id": analysis.patient_id,
+        "exam_id": analysis.exam_id,
+        "total_score": analysis.total_score,
+        "details": analysis.details_dict,  # JSON文字列を辞書に変換
+        "interpretation": analysis.interpretation,
+        "severity": analysis.severity,
+        "created_at": analysis.created_at,
+        "updated_at": analysis.updated_at
+    }
+    return schemas.AnalysisResultResponse(**analysis_dict)
+
+
+def load_latest_results(
+    db: Session,
+    patient_id: int,
+    exam_ids: List[int]
+) -> Dict[int, models.Result]:
+    """
+    患者の検査ごとの最新の検査結果を1回のクエリで取得します。
+
+    Returns:
+        検査IDをキー、最新の検査結果を値とする辞書
+    """
+    if not exam_ids:
+        return {}
+
+    latest_ids = (
+        db.query(func.max(models.Result.id).label("id"))
+        .filter(
+            models.Result.patient_id == patient_id,
+            models.Result.exam_id.in_(exam_ids)
+        )
+        .group_by(models.Result.exam_id)
+        .subquery()
+    )
+    results = (
+        db.query(models.Result)
+        .join(latest_ids, models.Result.id == latest_ids.c.id)
+        .all()
+    )
+    return {result.exam_id: result for result in results}
+
+
+def load_existing_analyses(
+    db: Session,
+    result_ids: List[int]
+) -> Dict[int, models.AnalysisResult]:
+    """
+    検査結果IDに対応する既存の解析結果を1回のクエリで取得します。
+
+    Returns:
+        検査結果IDをキー、解析結果を値とする辞書
+    """
+    if not result_ids:
+        return {}
+
+    analyses = db.query(models.AnalysisResult).filter(
+        models.AnalysisResult.result_id.in_(result_ids)
+    ).all()
+    return {analysis.result_id: analysis for analysis in analyses}
+
+
+def attach_norms(
+    analysis_result: Dict[str, Any],
+    exam_name: str,
+    patient: models.Patient,
+    taken_at: Optional[datetime] = None
+) -> None:
+    """
+    規準テーブルがある検査の場合、パーセンタイル順位とTスコアを解析結果の詳細に追加します。
+
+    年齢は規準テーブルの集計と同じく受検日時点 (taken_at) で計算します。
+    規準テーブルはメモリ上で参照するため、データベースへの問い合わせは発生しません。
+    """
+    if patient is None:
+        return
+    norm = norms.lookup(
+        exam_name,
+        analysis_result["total_score"],
+        patient.sex,
+        patient.birthdate,
+        on=taken_at
+    )
+    if norm is not None:
+        analysis_result["details"]["norms"] = norm
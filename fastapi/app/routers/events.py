@@ -0,0 +1,101 @@
+from fastapi import APIRouter, Header, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
+import asyncio
+import json
+import logging
+from typing import Optional
+
+from .. import schemas
+from ..events import broker, Event, TooManySubscribers
+
+# ロギングの設定
+logger = logging.getLogger(__name__)
+
+# ルーターの作成
+router = APIRouter()
+
+# 接続維持のためのコメントを送る間隔（秒）
+KEEPALIVE_INTERVAL = 15
+
+
+def format_event(event: Event) -> str:
+    """イベントをSSEの形式に変換します"""
+    data = json.dumps(event.data, ensure_ascii=False)
+    return f"id: {event.id}\nevent: {event.type}\ndata: {data}\n\n"
+
+
+@router.get(
+    "/events/analyses",
+    status_code=status.HTTP_200_OK,
+    responses={
+        200: {"content": {"text/event-stream": {}}, "description": "解析完了イベントのストリーム"},
+        503: {"model": schemas.HTTPError, "description": "購読者数が上限に達しています"}
+    }
+)
+async def stream_analysis_events(
+    request: Request,
+    patient_id: Optional[int] = Query(None, description="患者IDで絞り込み"),
+    exam_id: Optional[int] = Query(None, description="検査IDで絞り込み"),
+    last_event_id: Optional[str] = Header(None, description="最後に受信したイベントID（再接続時）")
+):
+    """
+    解析完了イベントを Server-Sent Events で配信します。
+
+    再接続時に Last-Event-ID ヘッダーを送ると、その後のイベントから再開します。
+    履歴が既に失われている場合やサーバーが再起動した場合は resync イベントを送るので、
+    クライアントは解析結果を取得し直してください。
+    """
+    if broker.is_full():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="イベントの購読者数が上限に達しています",
+            headers={"Retry-After": "10"}
+        )
+
+    # 購読はストリームの開始時に行い、終了時に必ず解除する
+    # （ハンドラーで購読すると、ストリームが開始されずに切断された場合に購読が残るため）
+    async def event_stream():
+        try:
+            subscription = broker.subscribe(patient_id=patient_id, exam_id=exam_id)
+        except TooManySubscribers:
+            # 上限の確認からストリーム開始までの間に他の接続で上限に達した場合
+            yield "retry: 10000\n\n"
+            return
+
+        try:
+            # 購読開始後に履歴を取得するため、その間に発行されたイベントも取りこぼさない
+            replay = broker.replay(subscription, last_event_id) if last_event_id is not None else []
+            if replay is None:
+                # resync には現時点の最新IDを付け、以降の再接続はそこから再開できるようにする
+                sent_seq = broker.latest_seq()
+                yield f"id: {broker.event_id(sent_seq)}\nevent: resync\ndata: {{}}\n\n"
+            else:
+                sent_seq = broker.parse_event_id(last_event_id) if last_event_id is not None else 0
+                for event in replay:
+                    sent_seq = event.seq
+                    yield format_event(event)
+
+            while not subscription.overflowed:
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), KEEPALIVE_INTERVAL)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keepalive\n\n"
+                    continue
+                if event.seq <= sent_seq:
+                    continue
+                sent_seq = event.seq
+                yield format_event(event)
+        finally:
+            broker.unsubscribe(subscription)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            # Nginxのバッファリングを無効化して即時に配信
+            "X-Accel-Buffering": "no"
+        }
+    )
@@ -0,0 +1,70 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+import asyncio
+import logging
+from datetime import datetime
+from typing import Optional
+
+from .. import schemas, search
+from ..admission import admit
+
+# ロギングの設定
+logger = logging.getLogger(__name__)
+
+# ルーターの作成
+router = APIRouter()
+
+@router.get(
+    "/search",
+    response_model=schemas.SearchResponse,
+    status_code=status.HTTP_200_OK,
+    dependencies=[Depends(admit("read"))],
+    responses={
+        400: {"model": schemas.HTTPError, "description": "検索条件が不正です"},
+        500: {"model": schemas.HTTPError, "description": "サーバーエラー"},
+        503: {"model": schemas.HTTPError, "description": "サーバーが混雑しています"}
+    }
+)
+async def search_free_texts(
+    q: str = Query(..., min_length=1, max_length=200, description="検索語（空白区切りでAND検索）"),
+    patient_id: Optional[int] = Query(None, description="患者IDで絞り込み"),
+    exam_id: Optional[int] = Query(None, description="検査IDで絞り込み"),
+    date_from: Optional[datetime] = Query(None, description="検査日時の下限"),
+    date_to: Optional[datetime] = Query(None, description="検査日時の上限"),
+    page: int = Query(1, ge=1, description="ページ番号"),
+    page_size: int = Query(20, ge=1, le=100, description="1ページあたりの件数")
+):
+    """
+    検査結果の自由記述を全文検索し、関連度順にページ単位で返します。
+    """
+    if not search.split_terms(q):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="検索語を指定してください"
+        )
+
+    try:
+        backend = search.get_backend()
+        total, hits = await asyncio.to_thread(
+            backend.search,
+            q,
+            patient_id=patient_id,
+            exam_id=exam_id,
+            date_from=date_from,
+            date_to=date_to,
+            offset=(page - 1) * page_size,
+            limit=page_size
+        )
+    except Exception as e:
+        logger.error("検索エラー: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="検索処理中にエラーが発生しました"
+        )
+
+    return schemas.SearchResponse(
+        query=q,
+        total=total,
+        page=page,
+        page_size=page_size,
+        hits=[schemas.SearchHit(**hit) for hit in hits]
+    )
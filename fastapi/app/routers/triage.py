@@ -0,0 +1,109 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session
+from sqlalchemy.exc import SQLAlchemyError
+import logging
+from datetime import datetime
+from typing import Optional
+
+from .. import schemas, models
+from ..database import get_db
+from ..admission import admit
+
+# ロギングの設定
+logger = logging.getLogger(__name__)
+
+# ルーターの作成
+router = APIRouter()
+
+@router.get(
+    "/triage",
+    response_model=schemas.TriageQueueResponse,
+    status_code=status.HTTP_200_OK,
+    dependencies=[Depends(admit("read"))],
+    responses={
+        500: {"model": schemas.HTTPError, "description": "サーバーエラー"},
+        503: {"model": schemas.HTTPError, "description": "サーバーが混雑しています"}
+    }
+)
+async def get_triage_queue(
+    patient_id: Optional[int] = Query(None, description="患者IDで絞り込み"),
+    before_id: Optional[int] = Query(None, description="このIDより古いフラグを取得（ページング用）"),
+    limit: int = Query(50, ge=1, le=200, description="取得件数"),
+    db: Session = Depends(get_db)
+):
+    """
+    未確認の高リスク所見を新しい順に取得します。
+
+    (acknowledged, id) のインデックス（患者で絞り込む場合は (patient_id, acknowledged, id)）を
+    逆順に走査するため、蓄積された解析結果の件数に関わらず一定の時間で返ります。
+    """
+    try:
+        # is_(False) は MySQL で "IS false" になりインデックスの範囲走査が使われないため、等価比較にする
+        query = db.query(models.TriageFlag).filter(
+            models.TriageFlag.acknowledged == False  # noqa: E712
+        )
+        if patient_id is not None:
+            query = query.filter(models.TriageFlag.patient_id == patient_id)
+        if before_id is not None:
+            query = query.filter(models.TriageFlag.id < before_id)
+
+        flags = query.order_by(models.TriageFlag.id.desc()).limit(limit).all()
+
+        return schemas.TriageQueueResponse(
+            flags=[schemas.TriageFlagResponse.model_validate(flag) for flag in flags],
+            next_before_id=flags[-1].id if len(flags) == limit else None
+        )
+    except SQLAlchemyError as e:
+        logger.error("データベースエラー: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="トリアージ一覧の取得中にエラーが発生しました"
+        )
+
+
+@router.post(
+    "/triage/{flag_id}/acknowledge",
+    response_model=schemas.TriageFlagResponse,
+    status_code=status.HTTP_200_OK,
+    dependencies=[Depends(admit("analyze"))],
+    responses={
+        404: {"model": schemas.HTTPError, "description": "トリアージフラグが見つかりません"},
+        500: {"model": schemas.HTTPError, "description": "サーバーエラー"},
+        503: {"model": schemas.HTTPError, "description": "サーバーが混雑しています"}
+    }
+)
+async def acknowledge_triage_flag(
+    flag_id: int,
+    request: Optional[schemas.AcknowledgeRequest] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    トリアージフラグを確認済みにします。
+
+    既に確認済みの場合は、最初の確認情報をそのまま返します。
+    """
+    flag = db.query(models.TriageFlag).filter(models.TriageFlag.id == flag_id).first()
+    if not flag:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"ID {flag_id} のトリアージフラグが見つかりません"
+        )
+
+    if flag.acknowledged:
+        return schemas.TriageFlagResponse.model_validate(flag)
+
+    try:
+        flag.acknowledged = True
+        flag.acknowledged_at = datetime.now()
+        flag.acknowledged_by = request.acknowledged_by if request else None
+        db.commit()
+        db.refresh(flag)
+        logger.info("トリアージフラグ %d を確認済みにしました", flag_id)
+        return schemas.TriageFlagResponse.model_validate(flag)
+    except SQLAlchemyError as e:
+        db.rollback()
+        logger.error("トリアージフラグ更新エラー: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="トリアージフラグの更新中にエラーが発生しました"
+        )
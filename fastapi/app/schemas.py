@@ -60,4 +60,65 @@ class HTTPError(BaseModel):
 
 # 健全性確認用
 class HealthCheck(BaseModel):
-    status: str
\ No newline at end of file
+    status: str
+
+# 検査セット解析用のスキーマ
+class ExamSetSection(BaseModel):
+    exam_id: int
+    exam_name: str
+    status: str = Field(..., description="analyzed / existing / no_result / unsupported / error")
+    analysis: Optional[AnalysisResultResponse] = Field(None, description="検査ごとの解析結果")
+    message: Optional[str] = Field(None, description="解析できなかった場合の理由")
+
+
+class ExamSetAnalysisResponse(BaseModel):
+    exam_set_id: int
+    exam_set_name: str
+    patient_id: int
+    sections: List[ExamSetSection] = Field(..., description="検査ごとのセクション")
+
+
+# 全文検索用のスキーマ
+class SearchHit(BaseModel):
+    result_id: int
+    patient_id: int
+    exam_id: int
+    created_at: Optional[datetime] = None
+    score: float = Field(..., description="関連度スコア")
+    snippet: str = Field(..., description="検索語周辺の抜粋")
+
+
+class SearchResponse(BaseModel):
+    query: str
+    total: int = Field(..., description="条件に一致した総件数")
+    page: int
+    page_size: int
+    hits: List[SearchHit]
+
+
+# リスクトリアージ用のスキーマ
+class TriageFlagResponse(BaseModel):
+    id: int
+    analysis_id: int
+    result_id: int
+    patient_id: int
+    exam_id: int
+    reason: str = Field(..., description="suicidal_ideation / severe")
+    total_score: Optional[float] = None
+    severity: Optional[str] = None
+    acknowledged: bool
+    acknowledged_at: Optional[datetime] = None
+    acknowledged_by: Optional[str] = None
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class TriageQueueResponse(BaseModel):
+    flags: List[TriageFlagResponse]
+    next_before_id: Optional[int] = Field(None, description="次のページを取得する際に before_id に指定する値")
+
+
+class AcknowledgeRequest(BaseModel):
+    acknowledged_by: Optional[str] = Field(None, max_length=255, description="確認者")
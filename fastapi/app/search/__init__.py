@@ -0,0 +1,213 @@
+"""
+自由記述の全文検索パッケージ
+
+検査結果の自由記述 (free0〜free4) を転置インデックスで検索できるようにします。
+バックエンドは環境変数 SEARCH_BACKEND で切り替えます:
+
+- mysql: result_search_documents テーブルのFULLTEXTインデックス (ngramパーサー)
+- sqlite: ローカルのSQLite FTS5 サイドカーファイル (テスト・ローカル開発用)
+
+検査結果はRemix側から登録されるため、インデクサーが一定間隔で
+前回取り込んだ検査結果ID以降の結果だけを取り込み、インデックスを差分更新します。
+同時に登録された検査結果は、IDの小さい方が後からコミットされることがあるため、
+取り込み時に飛ばされたIDの範囲を記録しておき、SEARCH_GAP_TIMEOUT 秒の間は
+毎回その範囲も確認します。
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, Any, List, Optional, Tuple
+
+from sqlalchemy import or_
+
+from .. import models
+from ..database import SessionLocal, DATABASE_URL
+
+logger = logging.getLogger(__name__)
+
+# 検索バックエンドの種類 (mysql / sqlite)
+SEARCH_BACKEND = os.getenv(
+    "SEARCH_BACKEND",
+    "mysql" if DATABASE_URL.startswith("mysql") else "sqlite"
+)
+
+# SQLite FTS5 サイドカーファイルのパス
+SEARCH_SQLITE_PATH = os.getenv("SEARCH_SQLITE_PATH", "search_index.sqlite3")
+
+# インデクサーの実行間隔（秒）と1回に取り込む件数
+SEARCH_SYNC_INTERVAL = float(os.getenv("SEARCH_SYNC_INTERVAL", "5"))
+SEARCH_BATCH_SIZE = int(os.getenv("SEARCH_BATCH_SIZE", "1000"))
+
+# 飛ばされたIDの範囲を確認し続ける時間（秒）
+# これより長く未コミットの検査結果や、ロールバック・削除で欠番になったIDは確認を打ち切ります
+SEARCH_GAP_TIMEOUT = float(os.getenv("SEARCH_GAP_TIMEOUT", "300"))
+
+# 検索結果の抜粋の前後文字数
+SNIPPET_CONTEXT = 40
+
+FREE_TEXT_FIELDS = [f"free{i}" for i in range(5)]
+
+_backend = None
+_last_indexed_id: Optional[int] = None
+
+# 取り込み時に飛ばされたIDの範囲 (最小ID, 最大ID, 記録した時刻)
+_gaps: List[Tuple[int, int, float]] = []
+
+
+def get_backend():
+    """設定された検索バックエンドを返します（初回呼び出し時に初期化）"""
+    global _backend
+    if _backend is None:
+        if SEARCH_BACKEND == "mysql":
+            from .mysql_fulltext import MySQLFulltextBackend
+            _backend = MySQLFulltextBackend()
+        elif SEARCH_BACKEND == "sqlite":
+            from .sqlite_fts import SQLiteFTSBackend
+            _backend = SQLiteFTSBackend(SEARCH_SQLITE_PATH)
+        else:
+            raise ValueError(f"不明な検索バックエンドです: {SEARCH_BACKEND}")
+        _backend.setup()
+        logger.info("検索バックエンド %s を初期化しました", SEARCH_BACKEND)
+    return _backend
+
+
+def build_document(result: models.Result) -> Optional[Dict[str, Any]]:
+    """
+    検査結果から検索用ドキュメントを作成します。
+
+    Returns:
+        ドキュメントの辞書、または自由記述がない場合はNone
+    """
+    texts = [
+        getattr(result, field) for field in FREE_TEXT_FIELDS
+        if getattr(result, field)
+    ]
+    if not texts:
+        return None
+    return {
+        "result_id": result.id,
+        "patient_id": result.patient_id,
+        "exam_id": result.exam_id,
+        "result_created_at": result.created_at,
+        "body": "\n".join(texts)
+    }
+
+
+def split_terms(query: str) -> List[str]:
+    """検索語を空白で分割します（全角空白も区切りとして扱う）"""
+    return query.replace("　", " ").split()
+
+
+def make_snippet(body: str, terms: List[str]) -> str:
+    """本文から最初に検索語が現れる箇所の前後を抜粋します"""
+    positions = [body.find(term) for term in terms if term in body]
+    start = max(min(positions) - SNIPPET_CONTEXT, 0) if positions else 0
+    end = start + SNIPPET_CONTEXT * 2 + max((len(term) for term in terms), default=0)
+    snippet = body[start:end]
+    if start > 0:
+        snippet = "…" + snippet
+    if end < len(body):
+        snippet = snippet + "…"
+    return snippet
+
+
+def _index_results(backend, results: List[models.Result]) -> int:
+    documents = [doc for doc in map(build_document, results) if doc]
+    if documents:
+        backend.upsert(documents)
+    return len(documents)
+
+
+def _record_gaps(previous_id: int, result_ids: List[int], now: float):
+    """連続していないIDの範囲を、後から確認する対象として記録します"""
+    for result_id in result_ids:
+        if result_id > previous_id + 1:
+            _gaps.append((previous_id + 1, result_id - 1, now))
+        previous_id = result_id
+
+
+def _recheck_gaps(db, backend, now: float) -> int:
+    """記録済みの範囲に後からコミットされた検査結果を取り込みます"""
+    global _gaps
+    _gaps = [gap for gap in _gaps if now - gap[2] < SEARCH_GAP_TIMEOUT]
+    if not _gaps:
+        return 0
+
+    results = (
+        db.query(models.Result)
+        .filter(or_(*(models.Result.id.between(low, high) for low, high, _ in _gaps)))
+        .order_by(models.Result.id)
+        .all()
+    )
+    if not results:
+        return 0
+
+    # 取り込んだIDを除いた残りの範囲を引き続き確認する
+    found = [result.id for result in results]
+    remaining = []
+    for low, high, recorded_at in _gaps:
+        for result_id in found:
+            if low <= result_id <= high:
+                if result_id > low:
+                    remaining.append((low, result_id - 1, recorded_at))
+                low = result_id + 1
+        if low <= high:
+            remaining.append((low, high, recorded_at))
+    _gaps = remaining
+
+    indexed = _index_results(backend, results)
+    db.expunge_all()
+    return indexed
+
+
+def sync_index() -> int:
+    """
+    前回取り込んだ検査結果ID以降の検査結果と、飛ばされたIDの範囲に
+    後からコミットされた検査結果をインデックスに取り込みます。
+
+    Returns:
+        新たに取り込んだドキュメントの数
+    """
+    global _last_indexed_id
+    backend = get_backend()
+    if _last_indexed_id is None:
+        _last_indexed_id = backend.max_indexed_id()
+
+    now = time.monotonic()
+    db = SessionLocal()
+    try:
+        indexed = _recheck_gaps(db, backend, now)
+        while True:
+            # 主キーの範囲走査のみで新しい検査結果を取得
+            results = (
+                db.query(models.Result)
+                .filter(models.Result.id > _last_indexed_id)
+                .order_by(models.Result.id)
+                .limit(SEARCH_BATCH_SIZE)
+                .all()
+            )
+            if not results:
+                break
+
+            indexed += _index_results(backend, results)
+            _record_gaps(_last_indexed_id, [result.id for result in results], now)
+            _last_indexed_id = results[-1].id
+            db.expunge_all()
+    finally:
+        db.close()
+
+    if indexed:
+        logger.info("検索インデックスに %d 件の検査結果を取り込みました", indexed)
+    return indexed
+
+
+async def run_indexer():
+    """検索インデックスを一定間隔で差分更新し続けます"""
+    while True:
+        try:
+            await asyncio.to_thread(sync_index)
+        except Exception as e:
+            logger.error("検索インデックスの更新に失敗しました: %s", e)
+        await asyncio.sleep(SEARCH_SYNC_INTERVAL)
@@ -0,0 +1,130 @@
+"""
+MySQL FULLTEXT インデックスによる検索バックエンド
+
+result_search_documents テーブルの本文に ngram パーサーのFULLTEXTインデックスを張り、
+MATCH ... AGAINST (BOOLEAN MODE) で検索します。
+ngram_token_size (既定値 2) より短い検索語（「死」など1文字の語）はFULLTEXTインデックスでは
+一致しないため、SQLiteバックエンドと同様に LOCATE による部分一致で絞り込みます。
+"""
+
+from datetime import datetime
+import os
+from typing import Dict, Any, List, Optional, Tuple
+
+from sqlalchemy import func, literal
+from sqlalchemy.dialects.mysql import insert
+
+from .. import models
+from ..database import SessionLocal, engine
+from . import split_terms, make_snippet
+
+# MySQLサーバーの ngram_token_size（これより短い検索語はFULLTEXTインデックスで検索できない）
+NGRAM_TOKEN_SIZE = int(os.getenv("MYSQL_NGRAM_TOKEN_SIZE", "2"))
+
+
+class MySQLFulltextBackend:
+    """result_search_documents テーブルを使う検索バックエンド"""
+
+    def setup(self):
+        """テーブルとFULLTEXTインデックスを作成します（既に存在する場合は何もしない）"""
+        models.ResultSearchDocument.__table__.create(bind=engine, checkfirst=True)
+
+    def max_indexed_id(self) -> int:
+        """取り込み済みの最大の検査結果IDを返します"""
+        db = SessionLocal()
+        try:
+            return db.query(func.max(models.ResultSearchDocument.result_id)).scalar() or 0
+        finally:
+            db.close()
+
+    def upsert(self, documents: List[Dict[str, Any]]):
+        """ドキュメントを一括で登録・更新します"""
+        stmt = insert(models.ResultSearchDocument.__table__).values(documents)
+        stmt = stmt.on_duplicate_key_update(
+            patient_id=stmt.inserted.patient_id,
+            exam_id=stmt.inserted.exam_id,
+            result_created_at=stmt.inserted.result_created_at,
+            body=stmt.inserted.body,
+            indexed_at=func.now()
+        )
+        with engine.begin() as conn:
+            conn.execute(stmt)
+
+    def search(
+        self,
+        query: str,
+        patient_id: Optional[int] = None,
+        exam_id: Optional[int] = None,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+        offset: int = 0,
+        limit: int = 20
+    ) -> Tuple[int, List[Dict[str, Any]]]:
+        """
+        検索語を全て含むドキュメントを関連度順に返します。
+
+        Returns:
+            (総件数, ヒットのリスト)
+        """
+        terms = split_terms(query)
+        if not terms:
+            return 0, []
+
+        doc = models.ResultSearchDocument
+        long_terms = [term for term in terms if len(term) >= NGRAM_TOKEN_SIZE]
+        if long_terms:
+            # 各検索語をフレーズとして必須指定し、演算子の混入を防ぐ
+            boolean_query = " ".join(
+                '+"' + term.replace('"', " ") + '"' for term in long_terms
+            )
+            match = doc.body.match(boolean_query)
+        else:
+            match = literal(0.0)
+
+        db = SessionLocal()
+        try:
+            base = db.query(doc)
+            if long_terms:
+                base = base.filter(match)
+            for term in terms:
+                if len(term) < NGRAM_TOKEN_SIZE:
+                    base = base.filter(func.locate(term, doc.body) > 0)
+            if patient_id is not None:
+                base = base.filter(doc.patient_id == patient_id)
+            if exam_id is not None:
+                base = base.filter(doc.exam_id == exam_id)
+            if date_from is not None:
+                base = base.filter(doc.result_created_at >= date_from)
+            if date_to is not None:
+                base = base.filter(doc.result_created_at <= date_to)
+
+            total = base.with_entities(func.count()).scalar()
+            rows = (
+                base.with_entities(
+                    doc.result_id,
+                    doc.patient_id,
+                    doc.exam_id,
+                    doc.result_created_at,
+                    doc.body,
+                    match.label("score")
+                )
+                .order_by(match.desc(), doc.result_id.desc())
+                .offset(offset)
+                .limit(limit)
+                .all()
+            )
+        finally:
+            db.close()
+
+        hits = [
+            {
+                "result_id": row.result_id,
+                "patient_id": row.patient_id,
+                "exam_id": row.exam_id,
+                "created_at": row.result_created_at,
+                "score": float(row.score),
+                "snippet": make_snippet(row.body, terms)
+            }
+            for row in rows
+        ]
+        return total, hits
@@ -0,0 +1,142 @@
+"""
+SQLite FTS5 サイドカーによる検索バックエンド
+
+MySQLを使わないテストやローカル開発向けに、別ファイルのSQLiteデータベースに
+trigramトークナイザーのFTS5仮想テーブルを作成して検索します。
+trigramは3文字未満の語を索引できないため、短い検索語は部分文字列の一致で絞り込みます。
+"""
+
+from contextlib import contextmanager
+from datetime import datetime
+import sqlite3
+from typing import Dict, Any, List, Optional, Tuple
+
+from . import split_terms, make_snippet
+
+
+class SQLiteFTSBackend:
+    """SQLite FTS5 仮想テーブルを使う検索バックエンド"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    @contextmanager
+    def _connect(self):
+        # 呼び出しごとに接続を作成する (インデクサーはスレッドプールで動作するため)
+        conn = sqlite3.connect(self.path)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def setup(self):
+        """FTS5仮想テーブルを作成します（既に存在する場合は何もしない）"""
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS result_fts USING fts5("
+                "body, result_id UNINDEXED, patient_id UNINDEXED, exam_id UNINDEXED, "
+                "result_created_at UNINDEXED, tokenize='trigram')"
+            )
+
+    def max_indexed_id(self) -> int:
+        """取り込み済みの最大の検査結果IDを返します"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT MAX(rowid) FROM result_fts").fetchone()
+        return row[0] or 0
+
+    def upsert(self, documents: List[Dict[str, Any]]):
+        """ドキュメントを一括で登録・更新します（rowidに検査結果IDを使用）"""
+        rows = [
+            (
+                doc["result_id"],
+                doc["body"],
+                doc["result_id"],
+                doc["patient_id"],
+                doc["exam_id"],
+                doc["result_created_at"].isoformat(sep=" ") if doc["result_created_at"] else None
+            )
+            for doc in documents
+        ]
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO result_fts "
+                "(rowid, body, result_id, patient_id, exam_id, result_created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+
+    def search(
+        self,
+        query: str,
+        patient_id: Optional[int] = None,
+        exam_id: Optional[int] = None,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+        offset: int = 0,
+        limit: int = 20
+    ) -> Tuple[int, List[Dict[str, Any]]]:
+        """
+        検索語を全て含むドキュメントを関連度順 (bm25) に返します。
+
+        Returns:
+            (総件数, ヒットのリスト)
+        """
+        terms = split_terms(query)
+        if not terms:
+            return 0, []
+
+        conditions = []
+        params: List[Any] = []
+
+        long_terms = [term for term in terms if len(term) >= 3]
+        if long_terms:
+            conditions.append("result_fts MATCH ?")
+            params.append(" ".join('"' + term.replace('"', '""') + '"' for term in long_terms))
+        for term in terms:
+            if len(term) < 3:
+                conditions.append("instr(body, ?) > 0")
+                params.append(term)
+
+        if patient_id is not None:
+            conditions.append("patient_id = ?")
+            params.append(patient_id)
+        if exam_id is not None:
+            conditions.append("exam_id = ?")
+            params.append(exam_id)
+        if date_from is not None:
+            conditions.append("result_created_at >= ?")
+            params.append(date_from.isoformat(sep=" "))
+        if date_to is not None:
+            conditions.append("result_created_at <= ?")
+            params.append(date_to.isoformat(sep=" "))
+
+        where = " AND ".join(conditions)
+        # bm25は値が小さいほど関連度が高いため、符号を反転してスコアとする
+        score = "-bm25(result_fts)" if long_terms else "0.0"
+
+        with self._connect() as conn:
+            total = conn.execute(
+                f"SELECT COUNT(*) FROM result_fts WHERE {where}", params
+            ).fetchone()[0]
+            rows = conn.execute(
+                f"SELECT result_id, patient_id, exam_id, result_created_at, body, {score} AS score "
+                f"FROM result_fts WHERE {where} "
+                "ORDER BY score DESC, result_id DESC LIMIT ? OFFSET ?",
+                params + [limit, offset]
+            ).fetchall()
+
+        hits = [
+            {
+                "result_id": row["result_id"],
+                "patient_id": row["patient_id"],
+                "exam_id": row["exam_id"],
+                "created_at": datetime.fromisoformat(row["result_created_at"]) if row["result_created_at"] else None,
+                "score": float(row["score"]),
+                "snippet": make_snippet(row["body"], terms)
+            }
+            for row in rows
+        ]
+        return total, hits
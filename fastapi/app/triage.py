@@ -0,0 +1,137 @@
+"""
+リスクトリアージモジュール
+
+解析結果から自殺念慮や重度判定などの高リスク所見を抽出し、
+triage_flags テーブルに登録するためのフラグを作成します。
+フラグは解析時に作成されるため、トリアージ一覧は details のJSONを
+解析することなくインデックス走査だけで取得できます。
+
+既存の解析結果からフラグを作成し直す場合:
+    python -m app.triage
+"""
+
+import json
+import logging
+from typing import Dict, Any, List, Set
+
+from . import models
+from .database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+# 検査ごとの自殺念慮の項目
+SUICIDAL_IDEATION_ITEMS: Dict[str, str] = {
+    "phq-9": "item8",
+}
+
+# 検査ごとの重度と判定する重症度
+SEVERE_LEVELS: Dict[str, Set[str]] = {
+    "phq-9": {"重度"},
+    "sds": {"重度のうつ状態"},
+}
+
+# 一度に処理する解析結果の件数（バックフィル用）
+BACKFILL_BATCH_SIZE = 1000
+
+
+def extract_risk_reasons(exam_name: str, analysis_result: Dict[str, Any]) -> List[str]:
+    """
+    解析結果から高リスク所見の種類を抽出します。
+
+    Args:
+        exam_name: 検査名
+        analysis_result: 解析モジュールの返り値 (details を含む辞書)
+
+    Returns:
+        リスクの種類のリスト (例: ["suicidal_ideation", "severe"])
+    """
+    exam_type = exam_name.lower()
+    reasons = []
+
+    item_key = SUICIDAL_IDEATION_ITEMS.get(exam_type)
+    if item_key:
+        item_scores = analysis_result.get("details", {}).get("item_scores", {})
+        if (item_scores.get(item_key) or 0) >= 1:
+            reasons.append("suicidal_ideation")
+
+    if analysis_result.get("severity") in SEVERE_LEVELS.get(exam_type, set()):
+        reasons.append("severe")
+
+    return reasons
+
+
+def build_triage_flags(
+    db_analysis: models.AnalysisResult,
+    exam_name: str,
+    analysis_result: Dict[str, Any]
+) -> List[models.TriageFlag]:
+    """
+    解析結果に対応するトリアージフラグを作成します。
+
+    フラグは解析結果とリレーションで結ばれるため、同じセッションに追加すれば
+    解析結果の保存と同時に登録されます。
+    """
+    return [
+        models.TriageFlag(
+            analysis=db_analysis,
+            result_id=db_analysis.result_id,
+            patient_id=db_analysis.patient_id,
+            exam_id=db_analysis.exam_id,
+            reason=reason,
+            total_score=db_analysis.total_score,
+            severity=db_analysis.severity,
+            acknowledged=False
+        )
+        for reason in extract_risk_reasons(exam_name, analysis_result)
+    ]
+
+
+def backfill() -> int:
+    """
+    フラグが未作成の既存の解析結果からトリアージフラグを作成します。
+
+    Returns:
+        作成したフラグの数
+    """
+    db = SessionLocal()
+    created = 0
+    last_id = 0
+    try:
+        flagged = models.TriageFlag.analysis_id
+        while True:
+            rows = (
+                db.query(models.AnalysisResult, models.Exam.examname)
+                .join(models.Exam, models.Exam.id == models.AnalysisResult.exam_id)
+                .filter(
+                    models.AnalysisResult.id > last_id,
+                    ~models.AnalysisResult.id.in_(db.query(flagged))
+                )
+                .order_by(models.AnalysisResult.id)
+                .limit(BACKFILL_BATCH_SIZE)
+                .all()
+            )
+            if not rows:
+                break
+
+            for analysis, exam_name in rows:
+                analysis_result = {
+                    "severity": analysis.severity,
+                    "details": json.loads(analysis.details) if analysis.details else {}
+                }
+                flags = build_triage_flags(analysis, exam_name, analysis_result)
+                db.add_all(flags)
+                created += len(flags)
+
+            db.commit()
+            last_id = rows[-1][0].id
+            db.expunge_all()
+    finally:
+        db.close()
+
+    logger.info("トリアージフラグを %d 件作成しました", created)
+    return created
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    backfill()
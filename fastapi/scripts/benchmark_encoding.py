@@ -0,0 +1,71 @@
+"""
+レスポンス形式の比較ベンチマーク（開発用）
+
+代表的な患者（PHQ-9とSDSを月1回ずつ受検）の一覧レスポンスで、
+形式ごとのサイズとエンコード時間を計測します。
+
+使い方 (fastapi ディレクトリで実行):
+    python -m scripts.benchmark_encoding [--results N] [--repeat N]
+"""
+
+import argparse
+from datetime import datetime, timedelta
+import random
+import timeit
+
+from app.analyzers.phq_9 import phq_9
+from app.analyzers.sds import sds
+from app.encoding import COLUMNAR_JSON, JSON, MSGPACK, encode_body, msgpack
+
+
+def build_payload(n_results: int):
+    """一覧エンドポイントと同じ形の解析結果のペイロードを作成します"""
+    rng = random.Random(0)
+    start = datetime(2024, 1, 1)
+    analyses = []
+    for i in range(n_results):
+        if i % 2 == 0:
+            exam_name, analyzer = "PHQ-9", phq_9
+            result_data = {f"item{j}": rng.randint(0, 3) for j in range(9)}
+        else:
+            exam_name, analyzer = "SDS", sds
+            result_data = {f"item{j}": rng.randint(1, 4) for j in range(20)}
+        analysis = analyzer(result_data)
+        analyses.append({
+            "id": i + 1,
+            "result_id": i + 1,
+            "exam_id": 1 if exam_name == "PHQ-9" else 2,
+            "exam_name": exam_name,
+            "total_score": analysis["total_score"],
+            "severity": analysis["severity"],
+            "interpretation": analysis["interpretation"],
+            "details": analysis["details"],
+            "created_at": (start + timedelta(days=15 * i)).isoformat(),
+            "archived": False
+        })
+    return {"analysis_results": analyses}
+
+
+def benchmark(n_results: int = 24, repeat: int = 200):
+    """形式ごとのサイズとエンコード時間を表示します"""
+    payload = build_payload(n_results)
+
+    media_types = [JSON, COLUMNAR_JSON] + ([MSGPACK] if msgpack is not None else [])
+    baseline = len(encode_body(payload, JSON))
+    print(f"{n_results} 件の解析結果")
+    for media_type in media_types:
+        size = len(encode_body(payload, media_type))
+        seconds = timeit.timeit(lambda: encode_body(payload, media_type), number=repeat) / repeat
+        print(f"{media_type:40s} {size:8d} バイト ({size / baseline:6.1%})  {seconds * 1e6:8.1f} µs")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="レスポンス形式ごとのサイズとエンコード時間を計測します")
+    parser.add_argument("--results", type=int, default=24, help="解析結果の件数")
+    parser.add_argument("--repeat", type=int, default=200, help="計測の繰り返し回数")
+    args = parser.parse_args()
+    benchmark(args.results, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""列指向JSON (app.encoding) の往復変換のテスト"""
+
+import json
+
+import pytest
+
+from app.encoding import decode_columnar, encode_columnar
+
+
+def roundtrip(payload):
+    # 実際のレスポンスと同じくJSON文字列を経由させる
+    return decode_columnar(json.loads(json.dumps(encode_columnar(payload))))
+
+
+@pytest.mark.parametrize("payload", [
+    [{}, {}],
+    {"analysis_results": [{"id": 1, "details": {}}, {"id": 2, "details": {}}]},
+    [],
+    [{}],
+    [[], []],
+    ["軽度", "軽度", "重度"],
+    ["軽度", "重度"],
+    {"values": [1, None, 2.5, True, "a"]},
+])
+def test_roundtrip_edge_cases(payload):
+    assert roundtrip(payload) == payload
+
+
+def test_roundtrip_mixed_shapes():
+    payload = {"analysis_results": [
+        {"id": 1, "severity": "軽度"},
+        {"id": 2},
+        {"severity": "重度", "id": 3},
+        {},
+        "text",
+        [1, 2],
+        None,
+    ]}
+    assert roundtrip(payload) == payload
+
+
+def test_roundtrip_nested_tables():
+    details = [
+        {
+            "item_scores": {"item0": score, "item1": 3 - score},
+            "domain_analysis": [
+                {"name": "気分/感情", "score": score, "severity": "軽度"},
+                {"name": "認知", "score": 0, "severity": "軽度"},
+            ],
+            "norms": {},
+        }
+        for score in range(3)
+    ]
+    payload = {"analysis_results": [
+        {"id": i, "details": detail, "flags": []} for i, detail in enumerate(details)
+    ]}
+    assert roundtrip(payload) == payload
+
+
+def test_table_node_records_row_count():
+    data = encode_columnar([{"id": 1}, {"id": 2}, {"id": 3}])["data"]
+    assert data["@n"] == 3
+
+
+def test_empty_dicts_are_not_encoded_as_table():
+    data = encode_columnar([{}, {}])["data"]
+    assert isinstance(data, list)